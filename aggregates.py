@@ -0,0 +1,160 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from analytics import CalorieLog
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class CalorieAggregate:
+    """
+    Daily calorie buckets and per-category totals of one spreadsheet.
+
+    Entries are kept in sheet row order so that the last row can be
+    removed again when the user deletes their latest entry.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.daily = {}
+        self.day_entries = {}
+        self.categories = {}
+        self.category_counts = {}
+        self.total = 0
+        self.last_day = None
+        self._log = None
+
+    @classmethod
+    def from_records(cls, records):
+        aggregate = cls()
+        for record in records:
+            aggregate.add(record['timestamp'], record['category'], record['calories'])
+        return aggregate
+
+    def add(self, timestamp, category, calories):
+        # 與原本的 get_all_records 計算相同，無法解析的資料會直接拋出例外
+        timestamp = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+        calories = int(calories)
+        day = timestamp.date()
+
+        self.entries.append((timestamp, category, calories))
+        self._log = None
+        self.daily[day] = self.daily.get(day, 0) + calories
+        self.day_entries.setdefault(day, []).append((timestamp, calories))
+        self.categories[category] = self.categories.get(category, 0) + calories
+        self.category_counts[category] = self.category_counts.get(category, 0) + 1
+        self.total += calories
+        if self.last_day is None or day > self.last_day:
+            self.last_day = day
+
+    def remove_last(self):
+        if not self.entries:
+            return
+        timestamp, category, calories = self.entries.pop()
+        self._log = None
+        day = timestamp.date()
+
+        self.daily[day] -= calories
+        # 最後一筆資料必定也是當天清單中最後加入的一筆
+        day_entries = self.day_entries[day]
+        day_entries.pop()
+        if not day_entries:
+            del self.daily[day]
+            del self.day_entries[day]
+
+        self.categories[category] -= calories
+        self.category_counts[category] -= 1
+        if not self.category_counts[category]:
+            del self.categories[category]
+            del self.category_counts[category]
+        self.total -= calories
+        if day == self.last_day and day not in self.daily:
+            self.last_day = max(self.daily) if self.daily else None
+
+    def sum_since(self, now, days):
+        """
+        Sums the calories of entries less than `days` days before `now`,
+        including entries timestamped after `now`. Runs in O(days).
+        """
+        cutoff = now - timedelta(days=days)
+        cutoff_day = cutoff.date()
+        total = sum(calories for timestamp, calories in self.day_entries.get(cutoff_day, ()) if timestamp > cutoff)
+
+        day = cutoff_day + timedelta(days=1)
+        last_day = max(now.date(), self.last_day) if self.last_day else now.date()
+        while day <= last_day:
+            total += self.daily.get(day, 0)
+            day += timedelta(days=1)
+        return total
+
+    def to_log(self):
+        """Returns the entries as a columnar CalorieLog, rebuilt only after changes."""
+        if self._log is None:
+            self._log = CalorieLog.from_entries(self.entries)
+        return self._log
+
+    def category_ratios(self):
+        return {category: (calories / self.total) * 100 for category, calories in self.categories.items()}
+
+
+class AggregateStore:
+    """
+    Per-spreadsheet calorie aggregates, updated incrementally by the Sheets
+    helpers and reconciled with the sheet only on a cold start or once they
+    are older than `max_age` seconds.
+    """
+
+    def __init__(self, max_age=600):
+        self.max_age = max_age
+        self._aggregates = {}
+        self._lock = threading.Lock()
+        self.reconciles = 0
+
+    def read(self, spreadsheet_id, load_records, query):
+        """
+        Returns `query(aggregate)` for `spreadsheet_id`, calling
+        `load_records()` first if the aggregate is missing or stale.
+        """
+        with self._lock:
+            entry = self._aggregates.get(spreadsheet_id)
+            if entry is not None and time.monotonic() - entry[1] < self.max_age:
+                return query(entry[0])
+
+        aggregate = CalorieAggregate.from_records(load_records())
+        with self._lock:
+            self._aggregates[spreadsheet_id] = (aggregate, time.monotonic())
+            self.reconciles += 1
+            return query(aggregate)
+
+    def _update(self, spreadsheet_id, update):
+        with self._lock:
+            entry = self._aggregates.get(spreadsheet_id)
+            if entry is None:
+                return
+            try:
+                update(entry[0])
+            except (KeyError, ValueError):
+                # 無法增量更新時，下次讀取再從試算表重新計算
+                del self._aggregates[spreadsheet_id]
+
+    def entry_count(self, spreadsheet_id):
+        """Returns the number of entries of the loaded aggregate, or None if it is not loaded."""
+        with self._lock:
+            entry = self._aggregates.get(spreadsheet_id)
+            return len(entry[0].entries) if entry is not None else None
+
+    def record_append(self, spreadsheet_id, row):
+        timestamp, category, _, calories = row
+        self._update(spreadsheet_id, lambda aggregate: aggregate.add(timestamp, category, calories))
+
+    def record_delete_last(self, spreadsheet_id):
+        self._update(spreadsheet_id, CalorieAggregate.remove_last)
+
+    def record_clear(self, spreadsheet_id):
+        with self._lock:
+            self._aggregates[spreadsheet_id] = (CalorieAggregate(), time.monotonic())
+
+    def invalidate(self, spreadsheet_id):
+        with self._lock:
+            self._aggregates.pop(spreadsheet_id, None)
@@ -0,0 +1,109 @@
+import numpy as np
+
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+class CalorieLog:
+    """
+    Columnar, time-sorted copy of a user's calorie log.
+
+    Timestamps are stored as datetime64[s], calories as float32 and
+    categories as int32 codes into `categories`, so windows, daily and
+    weekly series, rolling averages and category breakdowns are answered
+    with vectorized NumPy operations instead of per-row Python loops.
+    """
+
+    def __init__(self, timestamps, calories, category_codes, categories):
+        order = np.argsort(timestamps, kind='stable')
+        self.timestamps = timestamps[order]
+        self.calories = calories[order]
+        self.category_codes = category_codes[order]
+        self.categories = categories
+
+    @classmethod
+    def from_columns(cls, timestamps, categories, calories):
+        """
+        Builds a log from parallel sequences of '%Y-%m-%d %H:%M:%S' strings
+        (or datetimes), category names and calorie values.
+        """
+        names, codes = np.unique(np.asarray(categories, dtype=str), return_inverse=True)
+        return cls(
+            np.asarray(timestamps, dtype='datetime64[s]'),
+            np.asarray(calories, dtype=np.float32),
+            codes.astype(np.int32).reshape(-1),
+            names.tolist()
+        )
+
+    @classmethod
+    def from_records(cls, records):
+        """Builds a log from `get_all_records()` rows."""
+        return cls.from_columns(
+            [record['timestamp'] for record in records],
+            [record['category'] for record in records],
+            [record['calories'] for record in records]
+        )
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Builds a log from `(datetime, category, calories)` tuples."""
+        if not entries:
+            return cls.from_columns([], [], [])
+        timestamps, categories, calories = zip(*entries)
+        return cls.from_columns(timestamps, categories, calories)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _slice(self, start=None, end=None):
+        # 時間已排序，用二分搜尋找出 (start, end] 區間
+        lower = 0 if start is None else np.searchsorted(self.timestamps, np.datetime64(start, 's'), side='right')
+        upper = len(self.timestamps) if end is None else np.searchsorted(self.timestamps, np.datetime64(end, 's'), side='right')
+        return slice(lower, upper)
+
+    def total(self, start=None, end=None):
+        """Sums the calories with `start < timestamp <= end`; None leaves a side open."""
+        return float(self.calories[self._slice(start, end)].sum(dtype=np.float64))
+
+    def window_total(self, now, days):
+        """Sums the calories of entries less than `days` days before `now`, like the '加總' command."""
+        return self.total(np.datetime64(now, 's') - np.timedelta64(days, 'D'))
+
+    def daily_series(self, first_day, last_day):
+        """
+        Returns `(days, totals)` with one calorie total per calendar day from
+        `first_day` to `last_day` inclusive.
+        """
+        first_day = np.datetime64(first_day, 'D')
+        days = np.arange(first_day, np.datetime64(last_day, 'D') + ONE_DAY)
+        end_of_day = np.timedelta64(1, 's')
+        selected = self._slice(first_day - end_of_day, days[-1] + ONE_DAY - end_of_day)
+        offsets = (self.timestamps[selected].astype('datetime64[D]') - first_day).astype(np.int64)
+        totals = np.bincount(offsets, weights=self.calories[selected], minlength=len(days))
+        return days, totals
+
+    def weekly_series(self, last_day, weeks):
+        """
+        Returns `(week_starts, totals)` for `weeks` consecutive 7-day periods,
+        the last one ending on `last_day`.
+        """
+        last_day = np.datetime64(last_day, 'D')
+        days, totals = self.daily_series(last_day - np.timedelta64(7 * weeks - 1, 'D'), last_day)
+        return days[::7], totals.reshape(weeks, 7).sum(axis=1)
+
+    def rolling_average(self, first_day, last_day, window):
+        """
+        Returns `(days, averages)` with the mean daily calories over the
+        `window` days ending on each day from `first_day` to `last_day`.
+        """
+        first_day = np.datetime64(first_day, 'D')
+        days, totals = self.daily_series(first_day - np.timedelta64(window - 1, 'D'), last_day)
+        cumulative = np.concatenate(([0.0], np.cumsum(totals)))
+        averages = (cumulative[window:] - cumulative[:-window]) / window
+        return days[window - 1:], averages
+
+    def category_breakdown(self, start=None, end=None):
+        """Returns the calories per category for `start < timestamp <= end`, largest first."""
+        selected = self._slice(start, end)
+        totals = np.bincount(self.category_codes[selected], weights=self.calories[selected], minlength=len(self.categories))
+        order = np.argsort(-totals, kind='stable')
+        return {self.categories[code]: float(totals[code]) for code in order if totals[code]}
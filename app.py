@@ -1,16 +1,32 @@
 import os
 import json
+import functools
+import hmac
 import re
+import threading
+import time
+import atexit
+import concurrent.futures
 import openpyxl
 from datetime import datetime, timedelta
-from flask import Flask, request, abort
-from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError
+from flask import Flask, request, abort, jsonify
+from linebot import LineBotApi, WebhookParser
+from linebot.exceptions import InvalidSignatureError, LineBotApiError
 from linebot.models import MessageEvent, TextMessage, TextSendMessage, ImageMessage
 from google.oauth2.service_account import Credentials
 import gspread
-from cv_analyzer import analyze_image
-from food import food_dict
+from gspread.exceptions import APIError
+from cv_analyzer import analyze_image, read_image_bytes, preload, result_cache
+from food_search import FoodIndex
+from food_table import load_table
+from sheet_cache import WorksheetCache, CALLS_PER_OPEN
+from sheets_client import SheetsClient, is_retryable_error
+from aggregates import AggregateStore
+from dispatcher import KeyedDispatcher
+from write_behind import WriteBehindBuffer, WriteNotApplied
+from session_store import create_session_store
+from row_tracker import RowTracker, parse_updated_rows
+from metrics import metrics, span, TimedProxy, SamplingProfiler
 
 app = Flask(__name__)
 
@@ -19,7 +35,7 @@ LINE_CHANNEL_ACCESS_TOKEN = os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
 LINE_CHANNEL_SECRET = os.getenv('LINE_CHANNEL_SECRET')
 
 line_bot_api = LineBotApi(LINE_CHANNEL_ACCESS_TOKEN)
-handler = WebhookHandler(LINE_CHANNEL_SECRET)
+parser = WebhookParser(LINE_CHANNEL_SECRET)
 
 # Google Sheets API設定
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
@@ -33,10 +49,106 @@ else:
 
 gc = gspread.authorize(credentials)
 
-# 全域變數存儲用戶輸入狀態
-user_sheets = {}
-user_input_stage = {}
-user_input_data = {}
+# 所有 Google Sheets 呼叫共用的配額限制、重試與合併讀取。
+# 配額以每個行程計算，多個 worker 行程時請依行程數分配
+sheets_client = SheetsClient(
+    quota_per_minute=float(os.getenv('SHEETS_QUOTA_PER_MINUTE', '60')),
+    burst=int(os.getenv('SHEETS_BURST', '10')),
+    max_retries=int(os.getenv('SHEETS_MAX_RETRIES', '5')),
+    base_delay=float(os.getenv('SHEETS_BACKOFF_BASE', '1')),
+    max_delay=float(os.getenv('SHEETS_BACKOFF_MAX', '32')),
+    registry=metrics
+)
+
+# 每個 gspread 呼叫都記錄在 sheets.<方法名稱> 的延遲分布中，包含等待配額與重試的時間
+def open_worksheet(spreadsheet_id):
+    with span('sheets.open_worksheet'):
+        sheet = sheets_client.call(lambda: gc.open_by_key(spreadsheet_id).sheet1, tokens=CALLS_PER_OPEN)
+        return TimedProxy(sheets_client.worksheet(spreadsheet_id, sheet), 'sheets')
+
+# 共用的工作表快取，避免每則訊息都重新讀取試算表中繼資料
+worksheet_cache = WorksheetCache(
+    open_worksheet,
+    ttl=float(os.getenv('SHEET_CACHE_TTL', '300')),
+    max_size=int(os.getenv('SHEET_CACHE_SIZE', '256'))
+)
+
+# 新增的資料先寫入本地日誌，再合併成一次 append_rows 寫入試算表。
+# 每個行程使用各自的 <WRITE_BEHIND_JOURNAL>.<pid> 日誌，並接手已結束行程未寫入的資料
+write_buffer = WriteBehindBuffer(
+    lambda spreadsheet_id, rows: write_rows(spreadsheet_id, rows),
+    os.getenv('WRITE_BEHIND_JOURNAL', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'write_behind.journal')),
+    flush_interval=float(os.getenv('WRITE_BEHIND_INTERVAL', '0.5')),
+    max_rows=int(os.getenv('WRITE_BEHIND_MAX_ROWS', '50')),
+    is_permanent=lambda error: is_permanent_write_error(error)
+)
+write_buffer.start()
+atexit.register(write_buffer.stop)
+
+# 等待資料實際寫入試算表的秒數，超過則回覆已暫存
+SAVE_CONFIRM_TIMEOUT = float(os.getenv('SAVE_CONFIRM_TIMEOUT', '5'))
+
+# 回覆權杖約一分鐘內有效，超過此秒數改用推播訊息
+REPLY_TOKEN_TTL = float(os.getenv('REPLY_TOKEN_TTL', '50'))
+
+# 背景處理 webhook 事件：Google Sheets 與影像辨識各用一組執行緒池，
+# 同一位使用者的事件依序處理，確保 '新增' 多階段流程正確。
+# 影像執行緒數預設等於 YOLO 批次大小，同時到達的圖片才能合併推論
+dispatcher = KeyedDispatcher({
+    'sheets': int(os.getenv('SHEETS_WORKERS', '8')),
+    'cv': int(os.getenv('CV_WORKERS', os.getenv('YOLO_BATCH_SIZE', '4')))
+})
+atexit.register(dispatcher.shutdown, float(os.getenv('SHUTDOWN_TIMEOUT', '10')))
+
+# 啟動時預先載入 YOLO 模型，避免第一位傳送圖片的使用者等待
+if os.getenv('YOLO_PRELOAD') == '1':
+    preload()
+
+# 取樣式效能分析器，可用 PROFILER=1 在啟動時開啟，或透過 /debug/profile 切換
+profiler = SamplingProfiler(interval=float(os.getenv('PROFILER_INTERVAL_MS', '10')) / 1000)
+if os.getenv('PROFILER') == '1':
+    profiler.start()
+
+# 訊息類型對應的處理函式與執行緒池
+message_handlers = {}
+
+# 每個試算表的熱量統計，只在冷啟動或過期時重新讀取整張試算表
+aggregate_store = AggregateStore(max_age=float(os.getenv('AGGREGATE_MAX_AGE', '600')))
+
+# 記錄每個試算表的最後一列與最近新增的資料，刪除時不必下載整張試算表
+row_tracker = RowTracker(undo_depth=int(os.getenv('ROW_UNDO_DEPTH', '10')))
+
+# 尋找最後一列時每次讀取的列數，之後每次加倍
+ROW_SCAN_WINDOW = int(os.getenv('ROW_SCAN_WINDOW', '100'))
+
+# 報表涵蓋的天數、週數與飲食比例期間
+REPORT_DAYS = 7
+REPORT_WEEKS = 4
+REPORT_RATIO_DAYS = 30
+
+# 查詢大卡的最多顯示筆數
+KCAL_RESULT_LIMIT = 3
+
+# 食物資料表與名稱索引在第一次查詢時才載入
+food_index = None
+food_index_lock = threading.Lock()
+
+def get_food_index():
+    global food_index
+    if food_index is None:
+        with food_index_lock:
+            if food_index is None:
+                food_index = FoodIndex.from_table(load_table())
+    return food_index
+
+# 用戶的試算表連結與輸入狀態，sqlite:/// 後端可在重新啟動後保留，但不能在行程間共享：
+# 統計、最後一列追蹤、寫入暫存與同一用戶的事件順序都只在單一行程內有效，
+# 不論使用哪個後端都只能執行一個 worker 行程 (可使用多個執行緒)
+sessions = create_session_store(
+    os.getenv('SESSION_STORE', 'memory'),
+    idle_ttl=float(os.getenv('SESSION_IDLE_TTL', str(30 * 86400))),
+    max_sessions=int(os.getenv('SESSION_MAX', '10000'))
+)
 
 # 解析 Google Sheet 連結以獲取 spreadsheetId
 def get_spreadsheet_id(url):
@@ -47,31 +159,123 @@ def get_spreadsheet_id(url):
     else:
         return None
 
+# 發生權限或找不到試算表的錯誤時，讓快取的工作表失效
+def invalidates_worksheet(func):
+    @functools.wraps(func)
+    def wrapper(spreadsheet_id, *args, **kwargs):
+        with worksheet_cache.guard(spreadsheet_id):
+            return func(spreadsheet_id, *args, **kwargs)
+    return wrapper
+
+def message_handler(message_type, pool):
+    def decorator(func):
+        message_handlers[message_type] = (func, pool)
+        return func
+    return decorator
+
+def run_event(func, event, queued_at):
+    metrics.observe('dispatch.queue_wait', time.perf_counter() - queued_at)
+    with worksheet_cache.request_scope(), span(f'handler.{func.__name__}'):
+        func(event)
+
+def dispatch_event(event):
+    if not isinstance(event, MessageEvent):
+        return
+    entry = message_handlers.get(type(event.message))
+    if entry is None:
+        return
+    func, pool = entry
+    key = getattr(event.source, 'user_id', None) or event.reply_token
+    dispatcher.submit(key, pool, run_event, func, event, time.perf_counter())
+
+# 回覆權杖過期或失效時，改用推播訊息傳給使用者
+def reply(event, messages):
+    if time.time() - event.timestamp / 1000 < REPLY_TOKEN_TTL:
+        try:
+            with span('line.reply_message'):
+                line_bot_api.reply_message(event.reply_token, messages)
+            return
+        except LineBotApiError as e:
+            if e.status_code != 400:
+                raise
+            app.logger.warning(f"Reply token rejected, falling back to push: {e}")
+    with span('line.push_message'):
+        line_bot_api.push_message(event.source.user_id, messages)
+
 @app.route("/callback", methods=['POST'])
 def callback():
     signature = request.headers['X-Line-Signature']
     body = request.get_data(as_text=True)
-    app.logger.info("Request body: " + body)
+    # 只在除錯時記錄完整內容，避免大型請求的字串處理成本
+    app.logger.debug("Request body: %s", body)
 
-    try:
-        handler.handle(body, signature)
-    except InvalidSignatureError:
-        abort(400)
+    # 只在請求內驗證簽章，事件交給背景執行緒處理後立即回應
+    with span('webhook.callback'):
+        try:
+            with span('webhook.signature'):
+                events = parser.parse(body, signature)
+        except InvalidSignatureError:
+            abort(400)
+
+        with span('webhook.dispatch'):
+            for event in events:
+                dispatch_event(event)
 
     return 'OK'
 
-@handler.add(MessageEvent, message=ImageMessage)
+# 指標與效能分析需要帶上 Authorization: Bearer <METRICS_TOKEN>，未設定 METRICS_TOKEN 時關閉。
+# 不以來源位址判斷，因為經由同一台主機的反向代理時所有請求都來自 127.0.0.1
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+def require_metrics_token():
+    if not METRICS_TOKEN:
+        abort(404)
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        abort(403)
+
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    require_metrics_token()
+    return jsonify({
+        'latency': metrics.snapshot(),
+        'worksheet_cache': worksheet_cache.stats(),
+        'sheets_client': sheets_client.stats(),
+        'image_cache': result_cache.stats()
+    })
+
+@app.route("/debug/profile", methods=['GET', 'POST'])
+def profile_endpoint():
+    require_metrics_token()
+    if request.method == 'POST':
+        action = request.args.get('action', 'start')
+        if action == 'start':
+            profiler.start()
+        elif action == 'stop':
+            profiler.stop()
+        elif action == 'reset':
+            profiler.reset()
+        else:
+            abort(400)
+    try:
+        top = int(request.args.get('top', '30'))
+    except ValueError:
+        abort(400)
+    if top <= 0:
+        abort(400)
+    return jsonify(profiler.report(top))
+
+@message_handler(ImageMessage, pool='cv')
 def handle_image_message(event):
     message_id = event.message.id
-    temp_image_path = f'{message_id}.jpg'
 
     try:
-        message_content = line_bot_api.get_message_content(message_id)
-        with open(temp_image_path, 'wb') as fd:
-            for chunk in message_content.iter_content():
-                fd.write(chunk)
+        with span('line.get_message_content'):
+            message_content = line_bot_api.get_message_content(message_id)
+            image_bytes = read_image_bytes(message_content.iter_content(chunk_size=64 * 1024))
 
-        analysis_result = analyze_image(temp_image_path)
+        with span('cv.analyze_image'):
+            analysis_result = analyze_image(image_bytes)
 
         if analysis_result:
             item = analysis_result['item']
@@ -80,241 +284,398 @@ def handle_image_message(event):
         else:
             response_message = "抱歉，無法辨識圖片中的食物或飲料。"
 
-        line_bot_api.reply_message(
-            event.reply_token,
+        reply(
+            event,
             TextSendMessage(text=response_message)
         )
 
     except Exception as e:
         app.logger.error(f"Error processing image: {e}")
-        line_bot_api.reply_message(
-            event.reply_token,
+        reply(
+            event,
             TextSendMessage(text="處理圖片時發生錯誤，請稍後再試。 সন")
         )
-    finally:
-        if os.path.exists(temp_image_path):
-            os.remove(temp_image_path)
 
-@handler.add(MessageEvent, message=TextMessage)
+@message_handler(TextMessage, pool='sheets')
 def handle_message(event):
     user_id = event.source.user_id
-    user_message = event.message.text
+    session = sessions.get(user_id)
 
-    if user_id not in user_sheets:
-        line_bot_api.reply_message(
-            event.reply_token,
+    if session is None:
+        reply(
+            event,
             TextSendMessage(text="請提供您的 Google Sheet 連結")
         )
-        user_sheets[user_id] = None
+        sessions.set(user_id, {'sheet': None, 'stage': None, 'data': {}})
+        return
+
+    try:
+        process_message(event, session)
+    finally:
+        sessions.set(user_id, session)
+
+def process_message(event, session):
+    user_message = event.message.text
 
-    elif user_sheets[user_id] is None:
+    if session['sheet'] is None:
         spreadsheet_id = get_spreadsheet_id(user_message)
         if spreadsheet_id:
-            user_sheets[user_id] = spreadsheet_id
+            session['sheet'] = spreadsheet_id
             try:
                 add_headers(spreadsheet_id)
-                line_bot_api.reply_message(
-                    event.reply_token,
+                reply(
+                    event,
                     [
                         TextSendMessage(text="已成功連結到您的 Google Sheet。"),
-                        TextSendMessage(text="您現在可以傳送圖片來分析熱量，或輸入以下指令：\n'新增'：開始新增資料\n'清除'：刪除所有資料\n'刪除上一筆'：刪除上一筆新增資料\n'加總'：加總大卡\n'飲食比例'：獲取各種類的熱量比例\n'查詢大卡'：獲取各種食物的熱量")
+                        TextSendMessage(text="您現在可以傳送圖片來分析熱量，或輸入以下指令：\n'新增'：開始新增資料\n'清除'：刪除所有資料\n'刪除上一筆'：刪除上一筆新增資料\n'加總'：加總大卡\n'飲食比例'：獲取各種類的熱量比例\n'報表'：獲取近期的熱量報表\n'查詢大卡'：獲取各種食物的熱量")
                     ]
                 )
             except Exception as e:
-                line_bot_api.reply_message(
-                    event.reply_token,
+                reply(
+                    event,
                     TextSendMessage(text=f"連結失敗或無法添加標題行: {str(e)}")
                 )
         else:
-            line_bot_api.reply_message(
-                event.reply_token,
+            reply(
+                event,
                 TextSendMessage(text="無效的 Google Sheet 連結，請重新提供")
             )
 
     elif user_message == '新增':
-        user_input_stage[user_id] = 'category'
-        user_input_data[user_id] = {}
-        line_bot_api.reply_message(
-            event.reply_token,
+        session['stage'] = 'category'
+        session['data'] = {}
+        reply(
+            event,
             TextSendMessage(text="請輸入種類")
         )
 
     elif user_message == '清除':
         try:
-            clear_sheet(user_sheets[user_id])
+            clear_sheet(session['sheet'])
             response_message = "已清除所有資料"
         except Exception as e:
             response_message = f"無法清除資料: {str(e)}"
-        line_bot_api.reply_message(
-            event.reply_token,
+        reply(
+            event,
             TextSendMessage(text=response_message)
         )
 
     elif user_message == '刪除上一筆':
         try:
-            delete_last_entry(user_sheets[user_id])
+            delete_last_entry(session['sheet'])
             response_message = "已刪除最新的一筆資料"
         except Exception as e:
             response_message = f"無法刪除資料: {str(e)}"
-        line_bot_api.reply_message(
-            event.reply_token,
+        reply(
+            event,
             TextSendMessage(text=response_message)
         )
 
     elif user_message == '加總':
-        user_input_stage[user_id] = 'sum_period'
-        line_bot_api.reply_message(
-            event.reply_token,
+        session['stage'] = 'sum_period'
+        reply(
+            event,
             TextSendMessage(text="請輸入 '1天' 或 '7天' 來加總大卡")
         )
 
     elif user_message == '飲食比例':
         try:
-            category_ratios = calculate_category_ratios(user_sheets[user_id])
+            category_ratios = calculate_category_ratios(session['sheet'])
             response_message = "飲食比例:\n" + "\n".join([f"{category}: {ratio:.2f}%" for category, ratio in category_ratios.items()])
         except Exception as e:
             response_message = f"無法計算飲食比例: {str(e)}"
-        line_bot_api.reply_message(
-            event.reply_token,
+        reply(
+            event,
+            TextSendMessage(text=response_message)
+        )
+
+    elif user_message == '報表':
+        try:
+            response_message = build_report(session['sheet'])
+        except Exception as e:
+            response_message = f"無法產生報表: {str(e)}"
+        reply(
+            event,
             TextSendMessage(text=response_message)
         )
 
     elif user_message == '查詢大卡':
-        user_input_stage[user_id] = 'query_kcal'
-        line_bot_api.reply_message(
-            event.reply_token,
+        session['stage'] = 'query_kcal'
+        reply(
+            event,
             TextSendMessage(text="請輸入要查詢的食物名稱")
         )
 
     else:
-        stage = user_input_stage.get(user_id, None)
+        stage = session['stage']
         if stage == 'query_kcal':
-            result = search_kcal(user_message)
-            if result:
-                line_bot_api.reply_message(
-                    event.reply_token,
-                    TextSendMessage(text=result)
-                )
-            else:
-                line_bot_api.reply_message(
-                    event.reply_token,
-                    TextSendMessage(text=f"抱歉，我們的資料庫中沒有 '{user_message}' 的熱量資訊")
-                )
-            user_input_stage[user_id] = None
+            try:
+                result = search_kcal(user_message)
+                if not result:
+                    result = f"抱歉，我們的資料庫中沒有 '{user_message}' 的熱量資訊"
+            except Exception as e:
+                app.logger.exception("無法載入食物資料表")
+                result = f"無法查詢熱量: {str(e)}"
+            session['stage'] = None
+            reply(
+                event,
+                TextSendMessage(text=result)
+            )
 
-        if stage == 'category':
-            user_input_data[user_id]['category'] = user_message
-            user_input_stage[user_id] = 'name'
-            line_bot_api.reply_message(
-                event.reply_token,
+        elif stage == 'category':
+            session['data']['category'] = user_message
+            session['stage'] = 'name'
+            reply(
+                event,
                 TextSendMessage(text="請輸入名稱")
             )
         elif stage == 'name':
-            user_input_data[user_id]['name'] = user_message
-            user_input_stage[user_id] = 'calories'
-            line_bot_api.reply_message(
-                event.reply_token,
+            session['data']['name'] = user_message
+            session['stage'] = 'calories'
+            reply(
+                event,
                 TextSendMessage(text="請輸入大卡")
             )
         elif stage == 'calories':
-            user_input_data[user_id]['calories'] = user_message
-            user_input_data[user_id]['timestamp'] = (datetime.utcnow() + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S')
+            session['data']['calories'] = user_message
+            session['data']['timestamp'] = (datetime.utcnow() + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S')
             try:
-                append_values(user_sheets[user_id], user_input_data[user_id])
+                saved = append_values(session['sheet'], session['data'])
+                saved.result(timeout=SAVE_CONFIRM_TIMEOUT)
                 response_message = "訊息已儲存到Google Sheets"
+            except concurrent.futures.TimeoutError:
+                response_message = "訊息已暫存，稍後會自動寫入Google Sheets"
             except Exception as e:
                 response_message = f"無法儲存訊息到Google Sheets: {str(e)}"
             
-            user_input_stage[user_id] = None
-            user_input_data[user_id] = {}
+            session['stage'] = None
+            session['data'] = {}
 
-            line_bot_api.reply_message(
-                event.reply_token,
+            reply(
+                event,
                 TextSendMessage(text=response_message)
             )
         elif stage == 'sum_period':
             try:
                 if user_message in ['1天', '7天']:
                     days = 1 if user_message == '1天' else 7
-                    total_calories = sum_calories(user_sheets[user_id], days)
+                    total_calories = sum_calories(session['sheet'], days)
                     response_message = f"{user_message} 的總大卡為 {total_calories} 大卡"
                 else:
                     response_message = "無效的輸入，請輸入 '1天' 或 '7天'"
             except Exception as e:
                 response_message = f"無法計算總大卡: {str(e)}"
             
-            user_input_stage[user_id] = None
-            line_bot_api.reply_message(
-                event.reply_token,
+            session['stage'] = None
+            reply(
+                event,
                 TextSendMessage(text=response_message)
             )
         else:
-            line_bot_api.reply_message(
-                event.reply_token,
+            reply(
+                event,
                 [
                     TextSendMessage(text="無法識別的命令"),
-                    TextSendMessage(text="請輸入 '新增' 開始新增資料，輸入 '清除' 刪除所有資料，輸入 '刪除上一筆' 刪除上一筆新增資料，輸入 '加總' 加總大卡，輸入 '飲食比例' 獲取各種類的熱量比例，輸入 '查詢大卡' 獲取各種食物的熱量")
+                    TextSendMessage(text="請輸入 '新增' 開始新增資料，輸入 '清除' 刪除所有資料，輸入 '刪除上一筆' 刪除上一筆新增資料，輸入 '加總' 加總大卡，輸入 '飲食比例' 獲取各種類的熱量比例，輸入 '報表' 獲取近期的熱量報表，輸入 '查詢大卡' 獲取各種食物的熱量")
                 ]
             )
 
 def search_kcal(name):
-    for key in food_dict.keys():
-        if name in key:
-            return f"品項：{key}, 熱量：{int(food_dict[key][0])} kcal, 份量：{food_dict[key][1]}"
-    return None
+    keys = get_food_index().search(name, KCAL_RESULT_LIMIT)
+    if not keys:
+        return None
+    table = load_table()
+    lines = []
+    for key in keys:
+        calories, serving = table.get(key)
+        lines.append(f"品項：{key}, 熱量：{int(calories)} kcal, 份量：{serving}")
+    return "\n".join(lines)
         
+@invalidates_worksheet
 def add_headers(spreadsheet_id):
-    sheet = gc.open_by_key(spreadsheet_id).sheet1
+    sheet = worksheet_cache.get(spreadsheet_id)
     headers = ['timestamp', 'category', 'name', 'calories']
     if sheet.row_values(1) != headers:
         sheet.insert_row(headers, 1)
-        print(f"已添加標題行到試算表 {spreadsheet_id}")
+        row_tracker.invalidate(spreadsheet_id)
+        app.logger.debug("已添加標題行到試算表 %s", spreadsheet_id)
+
+# 新增資料不是冪等操作，只有配額錯誤 (請求未執行) 或確定沒有寫入時才重試，避免重複新增
+def is_permanent_write_error(error):
+    return not is_retryable_error(error, idempotent=False)
+
+@invalidates_worksheet
+def write_rows(spreadsheet_id, rows):
+    sheet = worksheet_cache.get(spreadsheet_id)
+    try:
+        response = sheet.append_rows(rows)
+    except Exception as e:
+        if isinstance(e, APIError) and e.code < 500:
+            if is_permanent_write_error(e):
+                # 這些資料不會寫入，統計需重新讀取試算表
+                aggregate_store.invalidate(spreadsheet_id)
+            raise
+        # 伺服器錯誤或逾時時資料可能已經寫入，檢查追蹤的最後一列之後的內容
+        landed = append_landed(sheet, spreadsheet_id, rows)
+        if landed is False:
+            raise WriteNotApplied(f"資料沒有寫入試算表: {e}") from e
+        if landed is None:
+            aggregate_store.invalidate(spreadsheet_id)
+            row_tracker.invalidate(spreadsheet_id)
+            raise
+        app.logger.warning("append_rows 失敗但資料已寫入試算表 %s: %s", spreadsheet_id, e)
+        response = None
+        first_row = row_tracker.tracked(spreadsheet_id)[0] + 1
+        updated_rows = (first_row, first_row + len(rows) - 1)
+    else:
+        updated_rows = parse_updated_rows(response)
+    if updated_rows:
+        row_tracker.record_append(spreadsheet_id, updated_rows[0], rows)
+    else:
+        row_tracker.invalidate(spreadsheet_id)
+    app.logger.debug("成功將 %d 筆資料新增到試算表 %s", len(rows), spreadsheet_id)
+
+# 確認失敗的 append_rows 是否已寫入：追蹤的最後一列必須不變，
+# 之後沒有資料代表沒有寫入，剛好是這些資料代表已寫入，其他情況無法判斷 (回傳 None)
+def append_landed(sheet, spreadsheet_id, rows):
+    tracked = row_tracker.tracked(spreadsheet_id)
+    if tracked is None:
+        return None
+    last_row, expected = tracked
+    try:
+        found = sheet.get(f'A{last_row}:D{last_row + len(rows)}')
+    except Exception as e:
+        app.logger.warning("無法確認試算表 %s 是否已寫入: %s", spreadsheet_id, e)
+        return None
+    if not found or not (any(found[0]) if expected is None else same_row(found[0], expected)):
+        return None
+    if len(found) == 1:
+        return False
+    if len(found) == len(rows) + 1 and all(same_row(values, row) for values, row in zip(found[1:], rows)):
+        return True
+    return None
 
 def append_values(spreadsheet_id, data):
-    sheet = gc.open_by_key(spreadsheet_id).sheet1
     row = [data['timestamp'], data['category'], data['name'], data['calories']]
-    sheet.append_row(row)
-    print(f"成功將資料 {row} 新增到試算表 {spreadsheet_id}")
+    saved = write_buffer.append(spreadsheet_id, row)
+    aggregate_store.record_append(spreadsheet_id, row)
+    return saved
 
+@invalidates_worksheet
 def clear_sheet(spreadsheet_id):
-    sheet = gc.open_by_key(spreadsheet_id).sheet1
+    sheet = worksheet_cache.get(spreadsheet_id)
+    write_buffer.discard_all(spreadsheet_id)
     sheet.clear()
+    aggregate_store.invalidate(spreadsheet_id)
+    row_tracker.invalidate(spreadsheet_id)
     sheet.append_row(['timestamp', 'category', 'name', 'calories'])
-    print(f"已清除試算表 {spreadsheet_id} 的所有資料")
-
+    aggregate_store.record_clear(spreadsheet_id)
+    row_tracker.reset(spreadsheet_id)
+    app.logger.debug("已清除試算表 %s 的所有資料", spreadsheet_id)
+
+# 試算表回傳的列會省略結尾的空白儲存格
+def same_row(values, expected):
+    values = [str(value) for value in values]
+    expected = [str(value) for value in expected]
+    while values and values[-1] == '':
+        values.pop()
+    while expected and expected[-1] == '':
+        expected.pop()
+    return values == expected
+
+# 只讀取最後一列與下一列，確認追蹤的位置仍然正確
+def is_last_row(sheet, last_row, expected):
+    rows = sheet.get(f'A{last_row}:D{last_row + 1}')
+    if len(rows) != 1:
+        return False
+    if expected is None:
+        return last_row == 1 or any(rows[0])
+    return same_row(rows[0], expected)
+
+# 從 first_row 往下分段讀取 A:D 欄，找出最後一列有資料的列號；
+# 只看 A 欄會漏掉 A 欄空白的列，也不必下載整欄
+def find_last_row(sheet, first_row=1):
+    start, window = first_row, ROW_SCAN_WINDOW
+    while True:
+        rows = sheet.get(f'A{start}:D{start + window - 1}')
+        if not rows and start == first_row > 1:
+            # 起點已超過最後一列 (資料被手動刪除)，改從第一列重新尋找
+            return find_last_row(sheet)
+        if len(rows) < window:
+            return start + len(rows) - 1
+        start += window
+        window *= 2
+
+def count_rows(sheet, spreadsheet_id):
+    # 已載入統計時，標題列加上資料筆數通常就是最後一列，只需讀取一小段
+    entries = aggregate_store.entry_count(spreadsheet_id)
+    return find_last_row(sheet, entries + 1 if entries else 1)
+
+@invalidates_worksheet
 def delete_last_entry(spreadsheet_id):
-    sheet = gc.open_by_key(spreadsheet_id).sheet1
-    last_row = len(sheet.get_all_values())
+    # 最新一筆還沒寫入試算表時，直接從暫存中移除；
+    # 寫入失敗而仍在暫存中的資料比試算表中的資料新，也要先刪除它
+    if write_buffer.discard_last(spreadsheet_id) is not None or (
+        not write_buffer.flush(spreadsheet_id) and write_buffer.discard_last(spreadsheet_id) is not None
+    ):
+        aggregate_store.record_delete_last(spreadsheet_id)
+        app.logger.debug("已刪除試算表 %s 尚未寫入的最新一筆資料", spreadsheet_id)
+        return
+
+    # 此時試算表已沒有等待寫入的資料，最後一列就是最新的一筆
+    sheet = worksheet_cache.get(spreadsheet_id)
+    seed = lambda: count_rows(sheet, spreadsheet_id)
+    last_row, expected, seeded = row_tracker.last_entry(spreadsheet_id, seed)
+    if not seeded and not is_last_row(sheet, last_row, expected):
+        # 使用者手動編輯過試算表，重新計算最後一列
+        row_tracker.invalidate(spreadsheet_id)
+        aggregate_store.invalidate(spreadsheet_id)
+        last_row, expected, seeded = row_tracker.last_entry(spreadsheet_id, seed)
     if last_row > 1:
         sheet.delete_rows(last_row)
-        print(f"已刪除試算表 {spreadsheet_id} 的最新一筆資料")
+        row_tracker.record_delete(spreadsheet_id)
+        aggregate_store.record_delete_last(spreadsheet_id)
+        app.logger.debug("已刪除試算表 %s 的最新一筆資料", spreadsheet_id)
     else:
-        print("試算表中無可刪除的資料")
+        app.logger.debug("試算表 %s 中無可刪除的資料", spreadsheet_id)
+
+def load_records(spreadsheet_id):
+    write_buffer.flush(spreadsheet_id)
+    return worksheet_cache.get(spreadsheet_id).get_all_records()
+
+def read_aggregate(spreadsheet_id, query):
+    return aggregate_store.read(spreadsheet_id, lambda: load_records(spreadsheet_id), query)
 
+@invalidates_worksheet
 def sum_calories(spreadsheet_id, days):
-    sheet = gc.open_by_key(spreadsheet_id).sheet1
-    all_records = sheet.get_all_records()
     now = datetime.utcnow() + timedelta(hours=8)
-    total_calories = sum(int(record['calories']) for record in all_records if (now - datetime.strptime(record['timestamp'], '%Y-%m-%d %H:%M:%S')).days < days)
-    return total_calories
+    return read_aggregate(spreadsheet_id, lambda aggregate: aggregate.sum_since(now, days))
 
+@invalidates_worksheet
 def calculate_category_ratios(spreadsheet_id):
-    sheet = gc.open_by_key(spreadsheet_id).sheet1
-    all_records = sheet.get_all_records()
-    category_totals = {}
-    total_calories = 0
-    
-    for record in all_records:
-        category = record['category']
-        calories = int(record['calories'])
-        total_calories += calories
-        if category in category_totals:
-            category_totals[category] += calories
-        else:
-            category_totals[category] = calories
-    
-    category_ratios = {category: (calories / total_calories) * 100 for category, calories in category_totals.items()}
-    return category_ratios
+    return read_aggregate(spreadsheet_id, lambda aggregate: aggregate.category_ratios())
+
+@invalidates_worksheet
+def build_report(spreadsheet_id):
+    now = datetime.utcnow() + timedelta(hours=8)
+    today = now.date()
+    log = read_aggregate(spreadsheet_id, lambda aggregate: aggregate.to_log())
+
+    days, totals = log.daily_series(today - timedelta(days=REPORT_DAYS - 1), today)
+    _, averages = log.rolling_average(today, today, REPORT_DAYS)
+    week_starts, week_totals = log.weekly_series(today, REPORT_WEEKS)
+    ratio_start = now - timedelta(days=REPORT_RATIO_DAYS)
+    breakdown = log.category_breakdown(ratio_start)
+    ratio_total = log.total(ratio_start)
+
+    lines = [f"近{REPORT_DAYS}天每日熱量:"]
+    lines += [f"{str(day)[5:]}: {total:.0f} 大卡" for day, total in zip(days, totals)]
+    lines.append(f"{REPORT_DAYS}天平均: {averages[-1]:.0f} 大卡/天")
+    lines.append(f"近{REPORT_WEEKS}週熱量:")
+    lines += [f"{str(start)[5:]} 起: {total:.0f} 大卡" for start, total in zip(week_starts, week_totals)]
+    lines.append(f"近{REPORT_RATIO_DAYS}天飲食比例:")
+    lines += [f"{category}: {calories / ratio_total * 100:.2f}%" for category, calories in breakdown.items()]
+    return "\n".join(lines)
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
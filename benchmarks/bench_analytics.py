@@ -0,0 +1,85 @@
+"""
+Compares the columnar CalorieLog with the original row-by-row Python
+calculation (int() and strptime on every record) on synthetic logs of
+10k to 1M rows.
+
+Usage: python benchmarks/bench_analytics.py [max rows]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from analytics import CalorieLog
+
+SIZES = (10_000, 100_000, 1_000_000)
+CATEGORIES = ['飲料', '主食', '點心', '水果', '蔬菜', '肉類']
+NOW = datetime(2026, 10, 18, 12, 0, 0)
+
+
+def make_records(rows):
+    rng = np.random.default_rng(rows)
+    seconds = rng.integers(0, 3 * 365 * 86400, rows)
+    base = np.datetime64(NOW, 's')
+    timestamps = np.datetime_as_string(base - seconds.astype('timedelta64[s]'), unit='s')
+    calories = rng.integers(10, 900, rows)
+    categories = rng.integers(0, len(CATEGORIES), rows)
+    return [
+        {'timestamp': timestamp.replace('T', ' '), 'category': CATEGORIES[category], 'name': 'x', 'calories': int(kcal)}
+        for timestamp, category, kcal in zip(timestamps, categories, calories)
+    ]
+
+
+def python_window(records, days):
+    return sum(int(record['calories']) for record in records if (NOW - datetime.strptime(record['timestamp'], '%Y-%m-%d %H:%M:%S')).days < days)
+
+
+def python_ratios(records):
+    totals = {}
+    total = 0
+    for record in records:
+        calories = int(record['calories'])
+        total += calories
+        totals[record['category']] = totals.get(record['category'], 0) + calories
+    return {category: calories / total * 100 for category, calories in totals.items()}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1]
+    today = NOW.date()
+
+    for rows in (size for size in SIZES if size <= max_rows):
+        records = make_records(rows)
+        print(f"{rows:,} rows")
+
+        load_ms, log = timed(CalorieLog.from_records, records)
+        queries = {
+            '7-day window': lambda: log.window_total(NOW, 7),
+            '365-day window': lambda: log.window_total(NOW, 365),
+            'daily series (1y)': lambda: log.daily_series(today - timedelta(days=364), today),
+            'weekly series (52w)': lambda: log.weekly_series(today, 52),
+            '7-day rolling avg (1y)': lambda: log.rolling_average(today - timedelta(days=364), today, 7),
+            'category breakdown': lambda: log.category_breakdown(),
+        }
+        print(f"  {'columnar load':<26} {load_ms:10.2f} ms")
+        for name, query in queries.items():
+            print(f"  {name:<26} {timed(query)[0]:10.3f} ms")
+
+        python_ms, expected = timed(python_window, records, 7)
+        assert abs(expected - log.window_total(NOW, 7)) < 1e-6
+        print(f"  {'python 7-day window':<26} {python_ms:10.2f} ms")
+        print(f"  {'python ratios':<26} {timed(python_ratios, records)[0]:10.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
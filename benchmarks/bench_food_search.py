@@ -0,0 +1,64 @@
+"""
+Compares the per-query latency of the indexed food lookup, built in
+memory or read in place from food.bin, against the original linear
+substring scan over the full food table.
+
+Usage: python benchmarks/bench_food_search.py [rounds]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from food import food_dict
+from food_search import FoodIndex
+from food_table import load_table
+
+QUERIES = ['可樂', '大麥', '珍珠奶茶', '雞腿', 'coca-cola', '蘋果', '白飯', '不存在的食物', '麵', '咖啡']
+
+
+def linear_scan(name):
+    for key in food_dict.keys():
+        if name in key:
+            return key
+    return None
+
+
+def linear_scan_all(name):
+    return [key for key in food_dict.keys() if name in key]
+
+
+def measure(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in QUERIES:
+            func(query)
+    return (time.perf_counter() - start) / (rounds * len(QUERIES))
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    start = time.perf_counter()
+    index = FoodIndex(food_dict.keys())
+    build_ms = (time.perf_counter() - start) * 1000
+
+    linear_us = measure(linear_scan, rounds) * 1e6
+    linear_all_us = measure(linear_scan_all, rounds) * 1e6
+    indexed_us = measure(lambda query: index.search(query, 5), rounds) * 1e6
+    stored = FoodIndex.from_table(load_table())
+    stored_us = measure(lambda query: stored.search(query, 5), rounds) * 1e6
+
+    print(f"food table: {len(food_dict)} entries, index build: {build_ms:.1f} ms")
+    print(f"linear scan (first hit):   {linear_us:8.1f} us/query")
+    print(f"linear scan (all hits):    {linear_all_us:8.1f} us/query")
+    print(f"indexed top-5:             {indexed_us:8.1f} us/query ({linear_all_us / indexed_us:.1f}x vs all hits)")
+    print(f"food.bin index top-5:      {stored_us:8.1f} us/query ({linear_all_us / stored_us:.1f}x vs all hits)")
+    print()
+    for query in QUERIES:
+        print(f"{query}: linear={linear_scan(query)!r} indexed={index.search(query, 3)}")
+
+
+if __name__ == '__main__':
+    main()
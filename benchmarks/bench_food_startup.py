@@ -0,0 +1,92 @@
+"""
+Measures the cold start cost of the food table in fresh interpreters: the
+time and peak RSS of the first food query with the food.py dict literal
+and with the memory-mapped food.bin, and the `import app` time and first
+'查詢大卡' reply of the app itself.
+
+Every probe runs once untimed first, so the bytecode cache is warm as on a
+deployed server and food.py is loaded from its .pyc instead of compiled.
+
+Usage: python benchmarks/bench_food_startup.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import resource, sys, time
+sys.path.insert(0, 'benchmarks')
+{setup}
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+{load}
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed, peak, peak - baseline)
+"""
+
+APP_SETUP = """
+import tempfile
+from fakes import FakeLineBotApi, FakeModel, FakeSheetsService, import_app
+journal_dir = tempfile.mkdtemp()
+"""
+
+VARIANTS = {
+    # 原本的做法：載入 food.py 後逐一比對名稱
+    'food.py literal + scan': ('', "from food import food_dict\nnext(key for key in food_dict if '可樂' in key)"),
+    'food.py literal + index': (
+        '',
+        "from food import food_dict\n"
+        "from food_search import FoodIndex\n"
+        "FoodIndex(food_dict).search('可樂', 3)"
+    ),
+    'food.bin + index': (
+        '',
+        "from food_table import load_table\n"
+        "from food_search import FoodIndex\n"
+        "table = load_table()\n"
+        "[table.get(name) for name in FoodIndex.from_table(table).search('可樂', 3)]"
+    ),
+    'import app': (
+        APP_SETUP,
+        "app = import_app(FakeSheetsService(), FakeLineBotApi(), journal_dir + '/journal', FakeModel())"
+    ),
+    'app first 查詢大卡': (
+        APP_SETUP + "app = import_app(FakeSheetsService(), FakeLineBotApi(), journal_dir + '/journal', FakeModel())",
+        "app.search_kcal('可樂')"
+    ),
+}
+
+
+def run(setup, load):
+    # 確保 .pyc 會寫入並被使用
+    env = {key: value for key, value in os.environ.items() if key not in ('PYTHONDONTWRITEBYTECODE', 'PYTHONPYCACHEPREFIX')}
+    output = subprocess.check_output(
+        [sys.executable, '-c', PROBE.format(setup=setup, load=load)],
+        cwd=BASE_DIR,
+        env=env,
+        stderr=subprocess.DEVNULL,
+    )
+    elapsed, peak, delta = output.split()
+    return float(elapsed), int(peak), int(delta)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print(f"{'variant':<24} {'load ms (median)':>17} {'peak RSS KiB':>13} {'RSS delta KiB':>14}")
+    for name, (setup, load) in VARIANTS.items():
+        # 先執行一次，產生 .pyc
+        run(setup, load)
+        samples = [run(setup, load) for _ in range(runs)]
+        elapsed = statistics.median(sample[0] for sample in samples) * 1000
+        peak = statistics.median(sample[1] for sample in samples)
+        delta = statistics.median(sample[2] for sample in samples)
+        print(f"{name:<24} {elapsed:>17.1f} {peak:>13.0f} {delta:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Compares the throughput of the old temp-file image path (write the LINE
+content to {message_id}.jpg, decode it from disk, delete it) with the
+in-memory path (buffer the stream, decode straight from the bytes).
+
+By default only the transfer and decode stages are timed. Pass --predict
+to also run YOLO on every image (requires ultralytics and yolov8n.pt).
+
+Usage: python benchmarks/bench_image_pipeline.py [images] [--predict]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+import cv_analyzer
+
+# 舊流程使用 iter_content() 預設的 1 KiB 區塊，新流程使用 64 KiB
+FILE_CHUNK_SIZE = 1024
+MEMORY_CHUNK_SIZE = 64 * 1024
+
+
+def make_images(count, width=1080, height=1440):
+    rng = np.random.default_rng(0)
+    base = np.linspace(0, 255, width * height * 3, dtype=np.float32).reshape(height, width, 3)
+    images = []
+    for _ in range(count):
+        noisy = np.clip(base + rng.normal(0, 20, base.shape), 0, 255).astype(np.uint8)
+        images.append(cv2.imencode('.jpg', noisy, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes())
+    return images
+
+
+def chunks(data, size):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+
+def file_pipeline(data, message_id, directory, predict):
+    path = os.path.join(directory, f'{message_id}.jpg')
+    try:
+        with open(path, 'wb') as fd:
+            for chunk in chunks(data, FILE_CHUNK_SIZE):
+                fd.write(chunk)
+        if predict:
+            return cv_analyzer.analyze_image(path)
+        return cv2.imread(path, cv2.IMREAD_COLOR)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def memory_pipeline(data, message_id, directory, predict):
+    image_bytes = cv_analyzer.read_image_bytes(chunks(data, MEMORY_CHUNK_SIZE))
+    if predict:
+        return cv_analyzer.analyze_image(image_bytes)
+    return cv_analyzer.decode_image(image_bytes)
+
+
+def measure(pipeline, images, directory, predict):
+    start = time.perf_counter()
+    for message_id, data in enumerate(images):
+        pipeline(data, message_id, directory, predict)
+    return len(images) / (time.perf_counter() - start)
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    predict = '--predict' in sys.argv
+    count = int(args[0]) if args else 50
+
+    images = make_images(count)
+    average_kb = sum(len(data) for data in images) / len(images) / 1024
+    print(f"{count} synthetic JPEGs, {average_kb:.0f} KiB on average, predict={predict}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        if predict:
+            # 先載入模型，避免第一張圖片的載入時間影響結果
+            memory_pipeline(images[0], 'warmup', directory, predict)
+        file_rate = measure(file_pipeline, images, directory, predict)
+        memory_rate = measure(memory_pipeline, images, directory, predict)
+
+    print(f"temp file: {file_rate:8.1f} images/s")
+    print(f"in memory: {memory_rate:8.1f} images/s ({memory_rate / file_rate:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Measures YOLO latency (p50/p99) and throughput on CPU through the
+batching InferenceService for batch sizes 1, 4 and 8.
+
+For each batch size the same number of client threads submit images
+concurrently, so the service can fill its batches. Requires ultralytics
+and the yolov8n.pt weights.
+
+Usage: python benchmarks/bench_inference.py [requests] [imgsz] [threads]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from cv_analyzer import InferenceService
+
+BATCH_SIZES = (1, 4, 8)
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+
+def run(batch_size, requests, imgsz, threads):
+    service = InferenceService(max_batch=batch_size, max_wait=0.01, imgsz=imgsz, threads=threads)
+    service.start(preload=True)
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, (720, 960, 3), dtype=np.uint8)
+    service.predict(image)
+
+    latencies = []
+    lock = threading.Lock()
+    per_client = max(1, requests // batch_size)
+
+    def client():
+        for _ in range(per_client):
+            start = time.perf_counter()
+            service.predict(image)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    clients = [threading.Thread(target=client) for _ in range(batch_size)]
+    start = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    wall = time.perf_counter() - start
+    return latencies, wall
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    imgsz = int(sys.argv[2]) if len(sys.argv) > 2 else 640
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    print(f"imgsz={imgsz} torch threads={threads or 'default'}")
+    print(f"{'batch':>5} {'requests':>8} {'p50 ms':>8} {'p99 ms':>8} {'images/s':>9}")
+    for batch_size in BATCH_SIZES:
+        latencies, wall = run(batch_size, requests, imgsz, threads)
+        print(
+            f"{batch_size:>5} {len(latencies):>8} {percentile(latencies, 50):>8.1f} "
+            f"{percentile(latencies, 99):>8.1f} {len(latencies) / wall:>9.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Measures message handling with each session store backend in the single
+worker process the app supports.
+
+For every backend a fresh process imports app.py with SESSION_STORE set
+and LINE and Google Sheets replaced by the fakes in fakes.py, links a
+sheet for every user and then replays the '新增' flow (category -> name ->
+calories) as signed webhooks through /callback, the dispatcher, the
+session store and the reply. The fakes add no latency and the
+write-behind interval is shortened, so the difference between the
+backends is the cost of the session reads and writes.
+
+The app keeps aggregates, the row tracker, the write-behind buffer and
+per-user event ordering in process, so it is not measured with several
+worker processes; see SqliteSessionStore.
+
+Usage: python benchmarks/bench_session_store.py [users] [rounds] [clients]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(url, users, rounds, clients, results):
+    sys.path.insert(0, BASE_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    from fakes import FakeLineBotApi, FakeSheetsService, FakeModel, import_app
+    from loadtest import CHANNEL_SECRET, SCENARIOS, Replayer, percentile, run_scenario
+
+    with tempfile.TemporaryDirectory() as journal_dir:
+        line = FakeLineBotApi()
+        app = import_app(
+            FakeSheetsService(),
+            line,
+            os.path.join(journal_dir, 'write_behind.journal'),
+            FakeModel(),
+            env={
+                'LINE_CHANNEL_SECRET': CHANNEL_SECRET,
+                'SESSION_STORE': url,
+                'SHEETS_QUOTA_PER_MINUTE': str(10 ** 9),
+                'SHEETS_BURST': str(10 ** 6),
+                # 儲存大卡時會等待寫入完成，縮短寫入間隔以免掩蓋 session 的成本
+                'WRITE_BEHIND_INTERVAL': '0.005',
+            }
+        )
+        replayer = Replayer(app, line, [b''])
+        user_ids = [f'U{index:032d}' for index in range(users)]
+        for user_id in user_ids:
+            client = app.app.test_client()
+            replayer.post(client, replayer.event(user_id, 'hi'))
+            replayer.post(client, replayer.event(user_id, f'https://docs.google.com/spreadsheets/d/sheet-{user_id}/edit'))
+        line.wait_for(2 * users)
+
+        result = run_scenario(replayer, user_ids, SCENARIOS['add'], rounds, clients)
+        results.put((
+            result['completed_rps'],
+            percentile(result['end_to_end'], 50),
+            percentile(result['end_to_end'], 99),
+            app.sessions.get(user_ids[0]) is not None,
+        ))
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    clients = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    # 每個後端都在新的行程中匯入 app.py
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        backends = {
+            'memory': 'memory',
+            'sqlite': f'sqlite:///{os.path.join(directory, "sessions.db")}',
+        }
+        print(f"users={users} rounds={rounds} clients={clients}, one worker process")
+        print(f"{'backend':<8} {'messages/s':>11} {'e2e p50 ms':>11} {'e2e p99 ms':>11}")
+        for name, url in backends.items():
+            results = context.Queue()
+            process = context.Process(target=measure, args=(url, users, rounds, clients, results))
+            process.start()
+            rate, p50, p99, saved = results.get()
+            process.join()
+            if not saved:
+                raise RuntimeError(f"{name}: sessions were not saved")
+            print(f"{name:<8} {rate:>11.0f} {p50:>11.1f} {p99:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
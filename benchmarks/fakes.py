@@ -0,0 +1,300 @@
+"""
+In-process stand-ins for the LINE Messaging API, Google Sheets (gspread)
+and the YOLO model, with configurable latency and Sheets quota errors.
+Used by loadtest.py to exercise app.py without any network access.
+"""
+import collections
+import json
+import re
+import threading
+import time
+import types
+
+import importlib.util
+import os
+import sys
+
+import requests
+from gspread.exceptions import APIError
+
+RANGE_PATTERN = re.compile(r'A(\d+):D(\d+)')
+
+
+class CallCounter:
+    """Thread-safe counter of API calls by name."""
+
+    def __init__(self):
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return collections.Counter(self._counts)
+
+
+def api_error(code, message, status):
+    response = requests.Response()
+    response.status_code = code
+    response._content = json.dumps({'error': {'code': code, 'message': message, 'status': status}}).encode()
+    return APIError(response)
+
+
+def quota_error():
+    return api_error(429, 'Quota exceeded (fake)', 'RESOURCE_EXHAUSTED')
+
+
+def server_error(code=503):
+    return api_error(code, 'Backend error (fake)', 'UNAVAILABLE')
+
+
+class FakeSheetsService:
+    """
+    Shared state of the fake Sheets backend: stored rows per spreadsheet,
+    per-call latency and a per-minute request quota like the real API.
+
+    Args:
+        latency (float): Seconds added to every API call.
+        quota_per_minute (int): Calls allowed per rolling minute, or None.
+    """
+
+    def __init__(self, latency=0.0, quota_per_minute=None):
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.calls = CallCounter()
+        self.quota_errors = 0
+        self.failures = collections.defaultdict(collections.deque)
+        self.sheets = {}
+        self.data_lock = threading.Lock()
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+
+    def fail_next(self, name, error, apply=False):
+        """
+        Makes the next `name` call raise `error`. With `apply=True` an append
+        still takes effect first, like a write that fails after landing.
+        """
+        with self._lock:
+            self.failures[name].append((error, apply))
+
+    def _injected_failure(self, name):
+        with self._lock:
+            queue = self.failures.get(name)
+            return queue.popleft() if queue else None
+
+    def call(self, name):
+        failure = self._injected_failure(name)
+        if failure is not None and not failure[1]:
+            self.calls.add(name)
+            raise failure[0]
+        if self.quota_per_minute is not None:
+            now = time.monotonic()
+            with self._lock:
+                while self._recent and now - self._recent[0] >= 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.quota_per_minute:
+                    self.quota_errors += 1
+                    raise quota_error()
+                self._recent.append(now)
+        self.calls.add(name)
+        if self.latency:
+            time.sleep(self.latency)
+        return failure[0] if failure is not None else None
+
+    def rows(self, key):
+        with self._lock:
+            return self.sheets.setdefault(key, [])
+
+
+class FakeWorksheet:
+    def __init__(self, service, key):
+        self.service = service
+        self.key = key
+        self._rows = service.rows(key)
+        self._lock = service.data_lock
+
+    def row_values(self, row):
+        self.service.call('row_values')
+        with self._lock:
+            return list(self._rows[row - 1]) if len(self._rows) >= row else []
+
+    def insert_row(self, values, index=1):
+        self.service.call('insert_row')
+        with self._lock:
+            self._rows.insert(index - 1, [str(value) for value in values])
+
+    def _append(self, rows):
+        with self._lock:
+            first = len(self._rows) + 1
+            self._rows.extend([str(value) for value in row] for row in rows)
+            return {'updates': {'updatedRange': f"'Sheet1'!A{first}:D{len(self._rows)}"}}
+
+    def append_row(self, values, **kwargs):
+        error = self.service.call('append_row')
+        response = self._append([values])
+        if error is not None:
+            raise error
+        return response
+
+    def append_rows(self, values, **kwargs):
+        error = self.service.call('append_rows')
+        response = self._append(values)
+        if error is not None:
+            raise error
+        return response
+
+    def clear(self):
+        self.service.call('clear')
+        with self._lock:
+            del self._rows[:]
+
+    def delete_rows(self, start, end=None):
+        self.service.call('delete_rows')
+        with self._lock:
+            del self._rows[start - 1:end or start]
+
+    def get(self, range_name, **kwargs):
+        self.service.call('get')
+        first, last = map(int, RANGE_PATTERN.search(range_name).groups())
+        with self._lock:
+            rows = [list(row) for row in self._rows[first - 1:last]]
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def col_values(self, col):
+        self.service.call('col_values')
+        with self._lock:
+            return [row[col - 1] for row in self._rows if len(row) >= col]
+
+    def get_all_values(self):
+        self.service.call('get_all_values')
+        with self._lock:
+            return [list(row) for row in self._rows]
+
+    def get_all_records(self, **kwargs):
+        self.service.call('get_all_records')
+        with self._lock:
+            if not self._rows:
+                return []
+            headers = self._rows[0]
+            return [dict(zip(headers, (int(value) if value.isdigit() else value for value in row))) for row in self._rows[1:]]
+
+
+class FakeSpreadsheet:
+    def __init__(self, service, key):
+        self.service = service
+        self.key = key
+
+    @property
+    def sheet1(self):
+        self.service.call('fetch_sheet_metadata')
+        return FakeWorksheet(self.service, self.key)
+
+
+class FakeGspreadClient:
+    def __init__(self, service):
+        self.service = service
+
+    def open_by_key(self, key):
+        self.service.call('fetch_sheet_metadata')
+        return FakeSpreadsheet(self.service, key)
+
+
+class FakeContent:
+    def __init__(self, data):
+        self.data = data
+
+    def iter_content(self, chunk_size=1024):
+        for offset in range(0, len(self.data), chunk_size):
+            yield self.data[offset:offset + chunk_size]
+
+
+class FakeLineBotApi:
+    """
+    Records replies with the time they were sent, keyed by reply token
+    (or user ID for pushes), and serves image content from `images`.
+    """
+
+    def __init__(self, latency=0.0, images=None):
+        self.latency = latency
+        self.images = images or {}
+        self.calls = CallCounter()
+        self.sent = {}
+        self._lock = threading.Lock()
+        self._sent_event = threading.Condition(self._lock)
+
+    def _record(self, key, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.sent[key] = (time.perf_counter(), messages)
+            self._sent_event.notify_all()
+
+    def reply_message(self, reply_token, messages, **kwargs):
+        self.calls.add('reply_message')
+        self._record(reply_token, messages)
+
+    def push_message(self, to, messages, **kwargs):
+        self.calls.add('push_message')
+        self._record(f'push:{to}:{time.perf_counter()}', messages)
+
+    def get_message_content(self, message_id, **kwargs):
+        self.calls.add('get_message_content')
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeContent(self.images[message_id])
+
+    def wait_for(self, count, timeout=60):
+        with self._lock:
+            return self._sent_event.wait_for(lambda: len(self.sent) >= count, timeout)
+
+
+class FakeModel:
+    """Stands in for YOLO: sleeps `latency` per batch and detects nothing."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def predict(self, images, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return [types.SimpleNamespace(names={}, boxes=[]) for _ in images]
+
+
+def import_app(sheets, line, journal_path, model=None, env=None):
+    """
+    Imports app.py with Sheets and LINE replaced by `sheets` and `line`, and
+    the YOLO model by `model` unless it is None. `env` adds environment
+    variables read at import time. Returns the app module.
+    """
+    os.environ.update({
+        'LINE_CHANNEL_SECRET': 'fake-secret',
+        'LINE_CHANNEL_ACCESS_TOKEN': 'fake-token',
+        'GOOGLE_SERVICE_ACCOUNT_INFO': '{}',
+        'WRITE_BEHIND_JOURNAL': journal_path,
+    })
+    os.environ.update(env or {})
+
+    import gspread
+    from google.oauth2 import service_account
+
+    service_account.Credentials.from_service_account_info = classmethod(lambda cls, info, **kwargs: None)
+    gspread.authorize = lambda credentials, **kwargs: FakeGspreadClient(sheets)
+
+    if model is not None and importlib.util.find_spec('ultralytics') is None:
+        # 使用假模型時不需要 ultralytics，但 cv_analyzer 會在匯入時載入它
+        placeholder = types.ModuleType('ultralytics')
+        placeholder.YOLO = None
+        sys.modules['ultralytics'] = placeholder
+
+    import app
+    import cv_analyzer
+
+    app.line_bot_api = line
+    if model is not None:
+        cv_analyzer.service._load_model = lambda: setattr(cv_analyzer.service, 'model', model)
+    return app
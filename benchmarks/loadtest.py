@@ -0,0 +1,238 @@
+"""
+Offline load test for app.py.
+
+Signed synthetic LINE webhook events are replayed against /callback through
+Flask's test client, while LINE, Google Sheets and the YOLO model are
+replaced by the in-process fakes in fakes.py. For every scenario the
+harness reports webhook throughput, acknowledgement and end-to-end (reply)
+latency percentiles, and the API calls made per user command.
+
+Usage:
+    python benchmarks/loadtest.py --users 50 --rounds 3 --clients 8 \\
+        --sheets-latency-ms 80 --line-latency-ms 30 --quota-per-minute 300
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from fakes import FakeLineBotApi, FakeModel, FakeSheetsService, import_app
+
+CHANNEL_SECRET = 'loadtest-secret'
+IMAGE = object()
+
+# 每個情境中，每位使用者依序傳送的訊息
+SCENARIOS = {
+    'add': ['新增', '飲料', '可樂', '150'],
+    'sum': ['加總', '7天'],
+    'ratio': ['飲食比例'],
+    'report': ['報表'],
+    'query': ['查詢大卡', '可樂'],
+    'delete': ['刪除上一筆'],
+    'image': [IMAGE],
+}
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) * 1000 if samples else 0.0
+
+
+def load_app(args, journal_dir):
+    """Imports app.py with LINE, Sheets and (unless --real-model) YOLO replaced by fakes."""
+    sheets = FakeSheetsService(latency=args.sheets_latency_ms / 1000, quota_per_minute=args.quota_per_minute)
+    line = FakeLineBotApi(latency=args.line_latency_ms / 1000)
+    model = None if args.real_model else FakeModel(latency=args.predict_latency_ms / 1000)
+    env = {'LINE_CHANNEL_SECRET': CHANNEL_SECRET}
+    if args.quota_per_minute is None:
+        # 假後端沒有配額時也不在用戶端節流，量測的才是 app 本身
+        env.update(SHEETS_QUOTA_PER_MINUTE=str(10 ** 9), SHEETS_BURST=str(10 ** 6))
+    else:
+        env.update(
+            SHEETS_QUOTA_PER_MINUTE=str(args.quota_per_minute),
+            SHEETS_BURST=str(max(1, min(10, args.quota_per_minute // 2)))
+        )
+    app = import_app(sheets, line, os.path.join(journal_dir, 'write_behind.journal'), model, env)
+    return app, sheets, line
+
+
+def make_images(count):
+    import cv2
+    rng = np.random.default_rng(0)
+    return [
+        cv2.imencode('.jpg', rng.integers(0, 255, (480, 640, 3), dtype=np.uint8))[1].tobytes()
+        for _ in range(count)
+    ]
+
+
+class Replayer:
+    """Builds signed webhook bodies and posts them to /callback."""
+
+    def __init__(self, app, line, images):
+        self.client_factory = app.app.test_client
+        self.line = line
+        self.images = images
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def _next_id(self):
+        with self._lock:
+            self._sequence += 1
+            return self._sequence
+
+    def event(self, user_id, message):
+        sequence = self._next_id()
+        if message is IMAGE:
+            message_id = f'img-{sequence}'
+            self.line.images[message_id] = self.images[sequence % len(self.images)]
+            payload = {'type': 'image', 'id': message_id, 'contentProvider': {'type': 'line'}}
+        else:
+            payload = {'type': 'text', 'id': f'msg-{sequence}', 'text': message}
+        return {
+            'type': 'message',
+            'mode': 'active',
+            'timestamp': int(time.time() * 1000),
+            'source': {'type': 'user', 'userId': user_id},
+            'webhookEventId': f'event-{sequence}',
+            'deliveryContext': {'isRedelivery': False},
+            'replyToken': f'token-{sequence}',
+            'message': payload,
+        }
+
+    @staticmethod
+    def sign(body):
+        digest = hmac.new(CHANNEL_SECRET.encode(), body.encode(), hashlib.sha256).digest()
+        return base64.b64encode(digest).decode()
+
+    def post(self, client, event):
+        body = json.dumps({'destination': 'loadtest', 'events': [event]})
+        start = time.perf_counter()
+        response = client.post(
+            '/callback',
+            data=body,
+            headers={'X-Line-Signature': self.sign(body), 'Content-Type': 'application/json'}
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"/callback returned {response.status_code}")
+        return start, time.perf_counter()
+
+
+def run_scenario(replayer, users, messages, rounds, clients):
+    """Posts every user's messages in order from `clients` threads and waits for all replies."""
+    expected = len(replayer.line.sent) + len(users) * len(messages) * rounds
+    sent_at = {}
+    ack_latencies = []
+    lock = threading.Lock()
+
+    def client_loop(client_users):
+        client = replayer.client_factory()
+        for _ in range(rounds):
+            for message in messages:
+                for user_id in client_users:
+                    event = replayer.event(user_id, message)
+                    start, end = replayer.post(client, event)
+                    with lock:
+                        sent_at[event['replyToken']] = start
+                        ack_latencies.append(end - start)
+
+    threads = [threading.Thread(target=client_loop, args=(users[index::clients],)) for index in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    posted = time.perf_counter()
+    completed = replayer.line.wait_for(expected)
+    finished = time.perf_counter()
+
+    end_to_end = [
+        replayer.line.sent[token][0] - sent
+        for token, sent in sent_at.items() if token in replayer.line.sent
+    ]
+    return {
+        'webhooks': len(ack_latencies),
+        'ack_rps': len(ack_latencies) / (posted - start),
+        'completed_rps': len(ack_latencies) / (finished - start),
+        'ack': ack_latencies,
+        'end_to_end': end_to_end,
+        'completed': completed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--clients', type=int, default=4, help='concurrent webhook senders')
+    parser.add_argument('--sheets-latency-ms', type=float, default=50)
+    parser.add_argument('--line-latency-ms', type=float, default=20)
+    parser.add_argument('--predict-latency-ms', type=float, default=40, help='per batch, fake model only')
+    parser.add_argument(
+        '--quota-per-minute', type=int, default=None,
+        help='fake Sheets quota, also used as the app limiter quota; unlimited if unset'
+    )
+    parser.add_argument('--images', type=int, default=16, help='distinct images replayed')
+    parser.add_argument('--real-model', action='store_true', help='run the real YOLO model')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    args = parser.parse_args()
+    if args.quota_per_minute is not None and args.quota_per_minute < 2:
+        parser.error('--quota-per-minute must be at least 2')
+
+    with tempfile.TemporaryDirectory() as journal_dir:
+        app, sheets, line = load_app(args, journal_dir)
+        replayer = Replayer(app, line, make_images(args.images))
+        users = [f'U{index:032d}' for index in range(args.users)]
+
+        # 先讓每位使用者連結試算表，不列入統計
+        for user_id in users:
+            client = app.app.test_client()
+            replayer.post(client, replayer.event(user_id, 'hi'))
+            replayer.post(client, replayer.event(user_id, f'https://docs.google.com/spreadsheets/d/sheet-{user_id}/edit'))
+        line.wait_for(2 * len(users))
+
+        print(
+            f"users={args.users} rounds={args.rounds} clients={args.clients} "
+            f"sheets={args.sheets_latency_ms}ms line={args.line_latency_ms}ms quota={args.quota_per_minute}"
+        )
+        header = (
+            f"{'scenario':<8} {'webhooks':>8} {'ack rps':>8} {'done rps':>8} {'ack p50':>8} {'ack p99':>8} "
+            f"{'e2e p50':>8} {'e2e p99':>8} {'sheets/cmd':>10} {'line/cmd':>8} {'429s':>5}"
+        )
+        print(header)
+        for name in args.scenarios.split(','):
+            messages = SCENARIOS[name]
+            sheets_before = sum(sheets.calls.snapshot().values())
+            line_before = sum(line.calls.snapshot().values())
+            errors_before = sheets.quota_errors
+
+            result = run_scenario(replayer, users, messages, args.rounds, args.clients)
+
+            commands = len(users) * args.rounds
+            sheets_calls = sum(sheets.calls.snapshot().values()) - sheets_before
+            line_calls = sum(line.calls.snapshot().values()) - line_before
+            print(
+                f"{name:<8} {result['webhooks']:>8} {result['ack_rps']:>8.0f} {result['completed_rps']:>8.0f} "
+                f"{percentile(result['ack'], 50):>8.1f} {percentile(result['ack'], 99):>8.1f} "
+                f"{percentile(result['end_to_end'], 50):>8.1f} {percentile(result['end_to_end'], 99):>8.1f} "
+                f"{sheets_calls / commands:>10.2f} {line_calls / commands:>8.2f} {sheets.quota_errors - errors_before:>5}"
+                + ('' if result['completed'] else '  (timed out waiting for replies)')
+            )
+
+        print()
+        print("Sheets calls by method:", dict(sheets.calls.snapshot()))
+        print("LINE calls by method:", dict(line.calls.snapshot()))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,46 +1,233 @@
 
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
 from ultralytics import YOLO
 
-# The model is now initialized inside the function to support lazy loading.
-model = None
+from metrics import metrics, span
+from result_cache import ResultCache, content_hash, perceptual_hash
+
+# Upper bound for an image kept in memory, LINE images are far smaller.
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+def read_image_bytes(chunks, max_bytes=MAX_IMAGE_BYTES):
+    """
+    Collects streamed image chunks into an in-memory buffer.
+
+    Args:
+        chunks (iterable): Byte chunks, e.g. from `iter_content()`.
+        max_bytes (int): Maximum accepted image size.
+
+    Returns:
+        bytes: The complete image data.
+
+    Raises:
+        ValueError: If the image is larger than `max_bytes`.
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise ValueError(f"Image exceeds {max_bytes} bytes")
+    return bytes(buffer)
+
+def decode_image(image):
+    """
+    Turns an image path, encoded image bytes or a decoded array into a
+    BGR ndarray that can be passed straight to the model.
+    """
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        decoded = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+    else:
+        decoded = cv2.imread(str(image), cv2.IMREAD_COLOR)
+    if decoded is None:
+        raise ValueError("Unable to decode image")
+    return decoded
+
+class InferenceService:
+    """
+    Persistent YOLO inference worker.
+
+    A single background thread owns the model, so predictions never run
+    concurrently on it. Requests arriving together are grouped into one
+    `model.predict` call of up to `max_batch` images, waiting at most
+    `max_wait` seconds for the batch to fill.
+
+    Args:
+        weights (str): The YOLO weights to load.
+        max_batch (int): Maximum number of images per predict call.
+        max_wait (float): Seconds to wait for more images after the first.
+        imgsz (int): Inference input resolution.
+        threads (int): CPU threads for torch, or None for the default.
+    """
+
+    def __init__(self, weights='yolov8n.pt', max_batch=4, max_wait=0.01, imgsz=640, threads=None):
+        self.weights = weights
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.imgsz = imgsz
+        self.threads = threads
+        self.model = None
+        self._requests = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
 
-def analyze_image(image_path):
+    def _load_model(self):
+        if self.threads:
+            import torch
+            torch.set_num_threads(self.threads)
+        print("Initializing YOLO model...")
+        with span('yolo.load'):
+            self.model = YOLO(self.weights)
+        print("YOLO model initialized.")
+
+    def start(self, preload=False):
+        """
+        Starts the worker thread, which loads the model right away.
+        With `preload` the call blocks until the model is ready.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='yolo-inference', daemon=True)
+                self._thread.start()
+        if preload:
+            self._loaded.wait()
+
+    def submit(self, image):
+        """Queues a decoded image and returns a Future of its YOLO result."""
+        future = Future()
+        self._requests.put((image, future))
+        self.start()
+        return future
+
+    def predict(self, image):
+        return self.submit(image).result()
+
+    def _next_batch(self):
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            self._load_model()
+        except Exception as e:
+            print(f"Failed to initialize YOLO model: {e}")
+            self._fail_pending(e)
+            raise
+        finally:
+            self._loaded.set()
+
+        while True:
+            batch = self._next_batch()
+            images = [image for image, _ in batch]
+            metrics.observe('yolo.batch_size', len(batch))
+            try:
+                with span('yolo.predict'):
+                    results = self.model.predict(images, imgsz=self.imgsz, verbose=False)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _fail_pending(self, error):
+        with self._lock:
+            self._thread = None
+        while True:
+            try:
+                _, future = self._requests.get_nowait()
+            except queue.Empty:
+                return
+            future.set_exception(error)
+
+
+# The model is loaded by the worker on the first photo, or at startup via preload().
+service = InferenceService(
+    weights=os.getenv('YOLO_WEIGHTS', 'yolov8n.pt'),
+    max_batch=int(os.getenv('YOLO_BATCH_SIZE', '4')),
+    max_wait=float(os.getenv('YOLO_BATCH_WAIT_MS', '10')) / 1000,
+    imgsz=int(os.getenv('YOLO_IMGSZ', '640')),
+    threads=int(os.getenv('YOLO_THREADS', '0')) or None
+)
+
+# Repeated photos are answered from this cache without running inference.
+phash_distance = os.getenv('IMAGE_CACHE_PHASH_DISTANCE')
+result_cache = ResultCache(
+    max_entries=int(os.getenv('IMAGE_CACHE_SIZE', '512')),
+    ttl=float(os.getenv('IMAGE_CACHE_TTL', '3600')),
+    phash_distance=int(phash_distance) if phash_distance else None
+)
+
+def preload():
+    """Loads the model now instead of on the first photo."""
+    service.start(preload=True)
+
+def find_bottle(result):
+    # The names dictionary maps class IDs to class names
+    class_names = result.names
+    for box in result.boxes:
+        class_id = int(box.cls[0])
+        class_name = class_names[class_id]
+
+        # For our MVP, we only care about 'bottle'
+        if class_name == 'bottle':
+            # Return a hardcoded calorie value for the MVP
+            return {"item": "瓶裝飲料", "calories": 150}
+    return None
+
+def analyze_image(image):
     """
     Analyzes an image using YOLOv8 to detect objects.
-    The model is loaded on the first call to this function.
+    Results are cached by the content hash of the image (and optionally
+    its perceptual hash), so a resent photo skips inference. Otherwise
+    the image is queued on the shared inference service, which may batch
+    it together with other photos arriving at the same time.
 
     Args:
-        image_path (str): The path to the image file.
+        image (str | bytes | numpy.ndarray): An image file path, encoded
+            image bytes or an already decoded BGR array.
 
     Returns:
         dict: A dictionary with item and calorie information 
               if a 'bottle' is detected, otherwise None.
     """
-    global model
-    # Initialize the model only if it hasn't been initialized yet.
-    if model is None:
-        print("Initializing YOLO model for the first time...")
-        model = YOLO('yolov8n.pt')
-        print("YOLO model initialized.")
+    if not isinstance(image, (np.ndarray, bytes, bytearray, memoryview)):
+        with open(image, 'rb') as fd:
+            image = fd.read()
 
-    # Run prediction on the image
-    results = model.predict(image_path, verbose=False)
-
-    # Check the results
-    for result in results:
-        # The names dictionary maps class IDs to class names
-        class_names = result.names
-        for box in result.boxes:
-            class_id = int(box.cls[0])
-            class_name = class_names[class_id]
-            
-            # For our MVP, we only care about 'bottle'
-            if class_name == 'bottle':
-                # Return a hardcoded calorie value for the MVP
-                return {"item": "瓶裝飲料", "calories": 150}
-
-    # If no bottle was found after checking all detections
-    return None
+    with span('cv.content_hash'):
+        key = content_hash(image)
+    found, analysis = result_cache.get(key)
+    if not found:
+        with span('cv.decode'):
+            decoded = decode_image(image)
+        phash = perceptual_hash(decoded) if result_cache.phash_distance is not None else None
+        found, analysis = result_cache.get_similar(phash)
+        if not found:
+            # Run prediction on the decoded image, no temporary file is needed
+            analysis = find_bottle(service.predict(decoded))
+        result_cache.put(key, analysis, phash)
+
+    # If no bottle was found after checking all detections this is None
+    return dict(analysis) if analysis else None
 
 if __name__ == '__main__':
     # This is for testing the module directly
@@ -0,0 +1,84 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedDispatcher:
+    """
+    Runs tasks on named thread pools while keeping tasks with the same key
+    (e.g. a LINE user ID) in submission order, even across pools.
+
+    Args:
+        pool_sizes (dict): Maps a pool name to its number of worker threads.
+    """
+
+    def __init__(self, pool_sizes):
+        self.pools = {
+            name: ThreadPoolExecutor(max_workers=size, thread_name_prefix=f'{name}-worker')
+            for name, size in pool_sizes.items()
+        }
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def submit(self, key, pool_name, func, *args):
+        """Queues `func(*args)` on `pool_name` after all earlier tasks for `key`."""
+        pool = self.pools[pool_name]
+        with self._lock:
+            queue = self._queues.setdefault(key, deque())
+            queue.append((pool, func, args))
+            if len(queue) > 1:
+                return
+        try:
+            pool.submit(self._run, pool, key, func, args)
+        except RuntimeError:
+            # 執行緒池已停止 (例如直譯器正在結束)，改在目前的執行緒執行
+            logger.warning("Pool %s is shut down, running task for %s inline", pool_name, key)
+            self._run(pool, key, func, args)
+
+    def _run(self, pool, key, func, args):
+        # 依序執行同一個 key 的任務；下一個任務屬於其他執行緒池時才交給該池
+        while True:
+            try:
+                func(*args)
+            except Exception:
+                logger.exception("Error while running task for %s", key)
+
+            with self._lock:
+                queue = self._queues[key]
+                queue.popleft()
+                if not queue:
+                    del self._queues[key]
+                    self._idle.notify_all()
+                    return
+                next_pool, func, args = queue[0]
+
+            if next_pool is not pool:
+                try:
+                    next_pool.submit(self._run, next_pool, key, func, args)
+                    return
+                except RuntimeError:
+                    # 執行緒池已停止，繼續在目前的執行緒執行，確保佇列會清空
+                    logger.warning("Pool is shut down, running task for %s inline", key)
+                pool = next_pool
+
+    def pending(self):
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def shutdown(self, timeout=10):
+        """
+        Waits up to `timeout` seconds for every queued task to run, then
+        stops the pools. Returns True if all tasks finished in time.
+        """
+        with self._lock:
+            drained = self._idle.wait_for(lambda: not self._queues, timeout)
+            pending = sum(len(queue) for queue in self._queues.values())
+        if not drained:
+            logger.warning("Dispatcher shut down with %d tasks still pending", pending)
+        for pool in self.pools.values():
+            pool.shutdown(wait=drained, cancel_futures=not drained)
+        return drained
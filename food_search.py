@@ -0,0 +1,151 @@
+import heapq
+import re
+import unicodedata
+
+# 括號內的別名，例如 '可樂(Coca-cola)' 中的 'Coca-cola'
+ALIAS_PATTERN = re.compile(r'\(([^()]*)\)')
+
+# 只有英文等拉丁字母的括號內容才是別名，'紅茶(大麥)' 中的 '大麥' 只是說明
+LATIN_PATTERN = re.compile(r'[a-z]')
+CJK_PATTERN = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]')
+
+# 排名等級，數字越小越優先
+RANK_EXACT = 0
+RANK_ALIAS = 1
+RANK_PREFIX = 2
+RANK_SUBSTRING = 3
+
+
+def normalize(text):
+    """
+    Normalizes a food name for indexing and querying.
+
+    Full-width characters are folded with NFKC (so '（' becomes '('),
+    letters are lower-cased and all whitespace is removed, because the
+    source table contains names such as '柳橙 汁' and '高 筋麵粉'.
+    """
+    text = unicodedata.normalize('NFKC', text)
+    return ''.join(text.lower().split())
+
+
+def is_latin_alias(text):
+    """Returns True if bracketed `text` is a Latin-script name such as 'coca-cola'."""
+    return bool(LATIN_PATTERN.search(text)) and not CJK_PATTERN.search(text)
+
+
+def split_aliases(name):
+    """
+    Returns the aliases of a normalized name: the part before the first
+    bracket (e.g. '可樂') and every Latin-script bracketed part (e.g.
+    'coca-cola'). Chinese qualifiers such as '(大麥)' or '(生)' describe
+    the food rather than name it, so they are not aliases.
+    """
+    aliases = set(alias for alias in ALIAS_PATTERN.findall(name) if is_latin_alias(alias))
+    base = name.split('(', 1)[0]
+    if base and base != name:
+        aliases.add(base)
+    return aliases
+
+
+class FoodIndex:
+    """
+    Prebuilt search index over the food table names.
+
+    Lookups use an exact-key hash, an alias hash for the base names and
+    bracketed English names and a character/bigram posting index for CJK
+    substrings, and return the top-k names ranked by match quality.
+    `from_table` searches the index stored in food.bin instead of
+    building one in memory.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.normalized = [normalize(name) for name in self.names]
+        self.exact = {}
+        self.aliases = {}
+        self.postings = {}
+
+        for position, key in enumerate(self.normalized):
+            self.exact.setdefault(key, position)
+            for alias in split_aliases(key):
+                self.aliases.setdefault(alias, []).append(position)
+            for gram in self._grams(key):
+                self.postings.setdefault(gram, set()).add(position)
+
+    @classmethod
+    def from_table(cls, table):
+        """Returns an index that reads the names and lookup tables of a `FoodTable` in place."""
+        index = cls.__new__(cls)
+        index.names = table.names
+        index.normalized = table.keys
+        index.exact = table.exact
+        index.aliases = table.aliases
+        index.postings = table.postings
+        return index
+
+    @staticmethod
+    def _grams(text):
+        # 單字索引用於一個字的查詢，雙字索引用於較長的查詢
+        grams = set(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        return grams
+
+    def _candidates(self, query):
+        if len(query) == 1:
+            return self.postings.get(query, set())
+        grams = [query[i:i + 2] for i in range(len(query) - 1)]
+        postings = [self.postings.get(gram) for gram in grams]
+        if not all(postings):
+            return set()
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return candidates
+
+    @staticmethod
+    def _rank(query, key, is_alias):
+        if key == query:
+            return RANK_EXACT
+        if is_alias:
+            return RANK_ALIAS
+        if key.startswith(query):
+            return RANK_PREFIX
+        return RANK_SUBSTRING
+
+    def search(self, query, limit=5):
+        """
+        Returns up to `limit` names matching `query`, best match first.
+
+        Ties within the same rank prefer the name closest in length to
+        the query, then the original table order.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+
+        # 每個候選的正規化名稱只讀取一次
+        alias_positions = set(self.aliases.get(query, ()))
+        keys = {p: self.normalized[p] for p in alias_positions}
+        exact = self.exact.get(query)
+        if exact is not None:
+            keys[exact] = query
+        for p in self._candidates(query):
+            if p not in keys:
+                key = self.normalized[p]
+                if query in key:
+                    keys[p] = key
+
+        ranked = heapq.nsmallest(
+            limit,
+            keys,
+            key=lambda p: (self._rank(query, keys[p], p in alias_positions), len(keys[p]), p)
+        )
+        return [self.names[p] for p in ranked]
+
+    def lookup(self, query):
+        """Returns the best matching name for `query`, or None."""
+        results = self.search(query, limit=1)
+        return results[0] if results else None
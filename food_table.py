@@ -0,0 +1,355 @@
+"""
+Compact, precompiled form of the food table in food.py.
+
+`python food_table.py` compiles food.py into food.bin: the names, their
+normalized search keys, a float32 calorie column, a uint16 serving-unit
+column that indexes into a deduplicated unit table, and the prebuilt
+search index (exact keys, aliases and character/bigram postings) as
+sorted key tables. food.bin is committed next to food.py and must be
+rebuilt whenever food.py changes; tests/test_food_table.py fails while it
+is outdated. The app only memory-maps it on the first query and searches
+the sorted tables in place, so nothing is parsed or rebuilt at runtime.
+A missing or unreadable food.bin is rebuilt as a fallback.
+"""
+import mmap
+import os
+import struct
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_PATH = os.path.join(BASE_DIR, 'food.py')
+TABLE_PATH = os.path.join(BASE_DIR, 'food.bin')
+
+MAGIC = b'FOOD'
+VERSION = 3
+# magic, version, 筆數, food.py 摘要
+HEADER = struct.Struct('<4sHI16s')
+
+# 標頭之後依序存放的陣列與型別代碼，每個陣列的位元組長度記在標頭後的 uint32 表中
+SECTIONS = (
+    ('name_offsets', 'I'), ('names', 'B'),
+    ('key_offsets', 'I'), ('keys', 'B'),
+    ('unit_offsets', 'I'), ('units', 'B'),
+    ('calories', 'f'),
+    ('unit_codes', 'H'),
+    # 名稱依字典序排列後的位置，用於 get()
+    ('sorted_names', 'H'),
+    # 正規化名稱依字典序排列後的位置，用於完全相符
+    ('sorted_keys', 'H'),
+    ('alias_offsets', 'I'), ('aliases', 'B'), ('alias_starts', 'I'), ('alias_positions', 'H'),
+    ('gram_offsets', 'I'), ('grams', 'B'), ('gram_starts', 'I'), ('gram_positions', 'H'),
+)
+SECTION_SIZES = struct.Struct(f'<{len(SECTIONS)}I')
+
+# 位置以 uint16 儲存
+MAX_ENTRIES = 0xFFFF
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def parse_kcal(value):
+    """Returns the calories of a food_dict value as a float, or None."""
+    try:
+        return float(value[0])
+    except (IndexError, TypeError, ValueError):
+        return None
+
+
+def _pad(length):
+    return (-length) % 4
+
+
+def source_digest(path=SOURCE_PATH):
+    """Returns the digest of food.py stored in the food.bin header, or None if it is missing."""
+    import hashlib
+    try:
+        with open(path, 'rb') as fd:
+            return hashlib.blake2b(fd.read(), digest_size=16).digest()
+    except FileNotFoundError:
+        return None
+
+
+def _string_arrays(strings):
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    return offsets, b''.join(encoded)
+
+
+def _posting_arrays(postings):
+    # 鍵依字典序排列，查詢時以二分搜尋尋找
+    keys = sorted(postings)
+    starts = [0]
+    positions = []
+    for key in keys:
+        positions.extend(sorted(postings[key]))
+        starts.append(len(positions))
+    return keys, starts, positions
+
+
+def build(source=None, path=TABLE_PATH):
+    """
+    Compiles `source` (defaults to food.food_dict) into the binary table.
+    Whitespace runs in names are collapsed to one space, and entries
+    without a numeric calorie value or with a duplicate name are dropped.
+    The table is written to a unique temporary file and atomically moved
+    into place, so concurrent builds never expose a partial file.
+
+    Returns:
+        int: The number of entries written.
+    """
+    import tempfile
+    from array import array
+    from food_search import FoodIndex
+
+    digest = b'\0' * 16
+    if source is None:
+        digest = source_digest() or digest
+        from food import food_dict as source
+
+    names = []
+    seen = set()
+    calories = []
+    unit_codes = []
+    units = {}
+    for name, value in source.items():
+        kcal = parse_kcal(value)
+        name = ' '.join(name.split())
+        if kcal is None or not name or name in seen:
+            continue
+        unit = ' '.join(str(value[1]).split())
+        seen.add(name)
+        names.append(name)
+        calories.append(kcal)
+        unit_codes.append(units.setdefault(unit, len(units)))
+    if len(names) > MAX_ENTRIES:
+        raise ValueError(f"食物資料超過 {MAX_ENTRIES} 筆: {len(names)}")
+
+    index = FoodIndex(names)
+    name_offsets, name_blob = _string_arrays(names)
+    key_offsets, key_blob = _string_arrays(index.normalized)
+    unit_offsets, unit_blob = _string_arrays(units)
+    aliases, alias_starts, alias_positions = _posting_arrays(index.aliases)
+    alias_offsets, alias_blob = _string_arrays(aliases)
+    grams, gram_starts, gram_positions = _posting_arrays(index.postings)
+    gram_offsets, gram_blob = _string_arrays(grams)
+    values = {
+        'name_offsets': name_offsets, 'names': name_blob,
+        'key_offsets': key_offsets, 'keys': key_blob,
+        'unit_offsets': unit_offsets, 'units': unit_blob,
+        'calories': calories,
+        'unit_codes': unit_codes,
+        'sorted_names': sorted(range(len(names)), key=names.__getitem__),
+        # 正規化後相同的名稱只保留第一筆，與 FoodIndex.exact 相同
+        'sorted_keys': sorted(index.exact.values(), key=index.normalized.__getitem__),
+        'alias_offsets': alias_offsets, 'aliases': alias_blob,
+        'alias_starts': alias_starts, 'alias_positions': alias_positions,
+        'gram_offsets': gram_offsets, 'grams': gram_blob,
+        'gram_starts': gram_starts, 'gram_positions': gram_positions,
+    }
+    sections = [array(typecode, values[name]).tobytes() for name, typecode in SECTIONS]
+
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f'{name}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(HEADER.pack(MAGIC, VERSION, len(names), digest))
+            tmp.write(SECTION_SIZES.pack(*(len(section) for section in sections)))
+            for section in sections:
+                tmp.write(section)
+                tmp.write(b'\0' * _pad(len(section)))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(names)
+
+
+class StringList:
+    """
+    Read-only sequence of UTF-8 strings stored in `data` (the mapped file)
+    as an offset array and a blob starting at byte `start`.
+    """
+
+    def __init__(self, offsets, data, start):
+        self._offsets = offsets
+        self._data = data
+        self._start = start
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def raw(self, index):
+        """Returns the UTF-8 bytes of string `index`."""
+        return self._data[self._start + self._offsets[index]:self._start + self._offsets[index + 1]]
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self._offsets) - 1:
+            raise IndexError(index)
+        return self.raw(index).decode('utf-8')
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+
+def _lower_bound(raw, count, key):
+    # 直接比較 UTF-8 位元組，其順序與 str 的排序相同，不必逐一解碼
+    lower, upper = 0, count
+    while lower < upper:
+        middle = (lower + upper) // 2
+        if raw(middle) < key:
+            lower = middle + 1
+        else:
+            upper = middle
+    return lower
+
+
+class PositionMap:
+    """
+    Read-only mapping from a unique string to its table position, found by
+    binary search over positions sorted by their string.
+    """
+
+    def __init__(self, strings, order):
+        self._strings = strings
+        self._order = order
+
+    def __len__(self):
+        return len(self._order)
+
+    def _raw(self, index):
+        return self._strings.raw(self._order[index])
+
+    def get(self, key, default=None):
+        key = key.encode('utf-8')
+        index = _lower_bound(self._raw, len(self._order), key)
+        if index < len(self._order) and self._raw(index) == key:
+            return self._order[index]
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        position = self.get(key)
+        if position is None:
+            raise KeyError(key)
+        return position
+
+
+class PostingMap:
+    """
+    Read-only mapping from sorted string keys to arrays of table positions,
+    found by binary search over the keys.
+    """
+
+    def __init__(self, keys, starts, positions):
+        self._keys = keys
+        self._starts = starts
+        self._positions = positions
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, key, default=None):
+        key = key.encode('utf-8')
+        index = _lower_bound(self._keys.raw, len(self._keys), key)
+        if index < len(self._keys) and self._keys.raw(index) == key:
+            return self._positions[self._starts[index]:self._starts[index + 1]]
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        positions = self.get(key)
+        if positions is None:
+            raise KeyError(key)
+        return positions
+
+
+class FoodTable:
+    """
+    Read-only view over a memory-mapped food.bin.
+
+    Only the small serving-unit table is decoded when the file is opened;
+    names, search keys, the calorie and unit columns and the search index
+    stay in the mapped file and are read on access.
+    """
+
+    def __init__(self, path=TABLE_PATH):
+        with open(path, 'rb') as fd:
+            self._mmap = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < HEADER.size + SECTION_SIZES.size:
+            raise ValueError(f"無效的食物資料表: {path}")
+        magic, version, self.count, self.source_digest = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"無效的食物資料表: {path}")
+
+        offset = HEADER.size + SECTION_SIZES.size
+        view = memoryview(self._mmap)
+        arrays = {}
+        starts = {}
+        for (name, typecode), size in zip(SECTIONS, SECTION_SIZES.unpack_from(self._mmap, HEADER.size)):
+            if offset + size > len(self._mmap):
+                raise ValueError(f"無效的食物資料表: {path}")
+            arrays[name] = view[offset:offset + size].cast(typecode)
+            starts[name] = offset
+            offset += size + _pad(size)
+        strings = lambda offsets, blob: StringList(arrays[offsets], self._mmap, starts[blob])
+
+        self.names = strings('name_offsets', 'names')
+        self.keys = strings('key_offsets', 'keys')
+        self.units = list(strings('unit_offsets', 'units'))
+        self.calories = arrays['calories']
+        self.unit_codes = arrays['unit_codes']
+        self.positions = PositionMap(self.names, arrays['sorted_names'])
+        self.exact = PositionMap(self.keys, arrays['sorted_keys'])
+        self.aliases = PostingMap(strings('alias_offsets', 'aliases'), arrays['alias_starts'], arrays['alias_positions'])
+        self.postings = PostingMap(strings('gram_offsets', 'grams'), arrays['gram_starts'], arrays['gram_positions'])
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def get(self, name):
+        """Returns `(calories, serving)` for `name`, or None if it is unknown."""
+        position = self.positions.get(name)
+        if position is None:
+            return None
+        return self.calories[position], self.units[self.unit_codes[position]]
+
+
+def _open(path):
+    """Returns the table at `path`, or None if it is missing or unreadable."""
+    try:
+        return FoodTable(path)
+    except (OSError, ValueError):
+        return None
+
+
+def load_table():
+    """Loads the food table on first use, rebuilding food.bin only if it is missing or unreadable."""
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                table = _open(TABLE_PATH)
+                if table is None:
+                    import logging
+                    logging.getLogger(__name__).warning("%s is missing or unreadable, rebuilding it from food.py", TABLE_PATH)
+                    build()
+                    table = FoodTable(TABLE_PATH)
+                _table = table
+    return _table
+
+
+if __name__ == '__main__':
+    written = build()
+    print(f"已將 {written} 筆食物資料編譯到 {TABLE_PATH}")
@@ -0,0 +1,199 @@
+import bisect
+import collections
+import functools
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# 延遲分布的桶界線 (秒)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with count, sum and max."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q):
+        """Estimates the `q` quantile by interpolating inside its bucket."""
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+            maximum = self.max
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else maximum
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, maximum)
+            seen += bucket_count
+        return maximum
+
+    def snapshot(self):
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, bucket_count in zip(self.buckets, self.counts):
+                cumulative += bucket_count
+                buckets[str(bound)] = cumulative
+            buckets['+Inf'] = self.count
+            snapshot = {'count': self.count, 'sum': self.sum, 'max': self.max, 'buckets': buckets}
+        snapshot['p50'] = self.quantile(0.5)
+        snapshot['p99'] = self.quantile(0.99)
+        return snapshot
+
+
+class MetricsRegistry:
+    """Named latency histograms fed by timing spans."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    @contextmanager
+    def span(self, name):
+        """Times the wrapped block into the `name` histogram, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """Decorator version of `span`."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
+
+
+class TimedProxy:
+    """Wraps an object so every method call is timed as '<prefix>.<method>'."""
+
+    def __init__(self, target, prefix, registry=None):
+        self._target = target
+        self._prefix = prefix
+        self._registry = registry or metrics
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+        return self._registry.timed(f'{self._prefix}.{name}')(attribute)
+
+
+class SamplingProfiler:
+    """
+    Low-overhead sampling profiler: a background thread records the stack
+    of every other thread each `interval` seconds, and `report()` lists the
+    functions seen most often, by own time and including callees.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = 0
+        self._own = collections.Counter()
+        self._total = collections.Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def reset(self):
+        with self._lock:
+            self.samples = 0
+            self._own.clear()
+            self._total.clear()
+
+    @staticmethod
+    def _label(frame):
+        code = frame.f_code
+        return f'{code.co_filename}:{code.co_firstlineno}:{code.co_name}'
+
+    def _run(self):
+        own_thread = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own_thread:
+                        continue
+                    self.samples += 1
+                    self._own[self._label(frame)] += 1
+                    seen = set()
+                    while frame is not None:
+                        label = self._label(frame)
+                        if label not in seen:
+                            seen.add(label)
+                            self._total[label] += 1
+                        frame = frame.f_back
+
+    def report(self, top=30):
+        with self._lock:
+            return {
+                'running': self.running,
+                'interval': self.interval,
+                'samples': self.samples,
+                'own': self._own.most_common(top),
+                'total': self._total.most_common(top),
+            }
+
+
+metrics = MetricsRegistry()
+span = metrics.span
+timed = metrics.timed
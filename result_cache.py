@@ -0,0 +1,127 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def content_hash(data):
+    """Returns the SHA-256 digest of encoded image bytes or a decoded array."""
+    digest = hashlib.sha256()
+    if isinstance(data, np.ndarray):
+        digest.update(f'{data.shape}{data.dtype}'.encode())
+        data = np.ascontiguousarray(data)
+    digest.update(data)
+    return digest.digest()
+
+
+def perceptual_hash(image):
+    """
+    Returns a 64-bit difference hash (dHash) of a decoded BGR image.
+    Re-encoded or slightly resized copies of a photo hash to nearby values.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    return int.from_bytes(bits.tobytes(), 'big')
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class ResultCache:
+    """
+    Bounded LRU/TTL cache of image analysis results keyed by the content
+    hash of the image bytes, with an optional perceptual-hash lookup for
+    near-duplicate photos.
+
+    Args:
+        max_entries (int): Maximum number of cached results.
+        ttl (float): Seconds a cached result stays valid.
+        phash_distance (int): Maximum Hamming distance between perceptual
+            hashes to count as the same photo, or None to disable.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600, phash_distance=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.phash_distance = phash_distance
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def _expire(self, now):
+        # 只清除最久未使用端已過期的項目，其餘在查詢時逐筆檢查
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[2] > now:
+                break
+            del self._entries[key]
+
+    def get(self, key):
+        """Returns `(True, result)` for a cached content hash, otherwise `(False, None)`."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[2] <= now:
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def get_similar(self, phash):
+        """Looks up a near-duplicate by perceptual hash; counts a miss if none is found."""
+        now = time.monotonic()
+        with self._lock:
+            if self.phash_distance is not None and phash is not None:
+                for key, (result, cached_phash, expires_at) in reversed(self._entries.items()):
+                    if expires_at <= now or cached_phash is None:
+                        continue
+                    if hamming_distance(phash, cached_phash) <= self.phash_distance:
+                        self._entries.move_to_end(key)
+                        self.near_hits += 1
+                        return True, result
+            self.misses += 1
+            return False, None
+
+    def put(self, key, result, phash=None):
+        with self._lock:
+            self._entries[key] = (result, phash, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def memory_bytes(self):
+        """Approximate memory held by the cached keys, results and entries."""
+        with self._lock:
+            total = sys.getsizeof(self._entries)
+            for key, entry in self._entries.items():
+                total += sys.getsizeof(key) + sys.getsizeof(entry)
+                result = entry[0]
+                if result is not None:
+                    total += sys.getsizeof(result)
+                    total += sum(sys.getsizeof(value) for value in result.values())
+            return total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            stats = {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            }
+        stats['memory_bytes'] = self.memory_bytes()
+        return stats
@@ -0,0 +1,96 @@
+import re
+import threading
+from collections import deque
+
+# 例如 "'工作表1'!A5:D7" 或 "Sheet1!A5"
+UPDATED_RANGE_PATTERN = re.compile(r'!\$?[A-Z]+\$?(\d+)(?::\$?[A-Z]+\$?(\d+))?$')
+
+
+def parse_updated_rows(response):
+    """
+    Returns the `(first_row, last_row)` written by an append call, taken from
+    the `updates.updatedRange` of its API response, or None if it is missing.
+    """
+    try:
+        updated_range = response['updates']['updatedRange']
+    except (KeyError, TypeError):
+        return None
+    match = UPDATED_RANGE_PATTERN.search(updated_range)
+    if not match:
+        return None
+    first_row = int(match.group(1))
+    return first_row, int(match.group(2) or first_row)
+
+
+class RowTracker:
+    """
+    Tracks the last data row of each spreadsheet, plus an undo stack of the
+    most recently appended rows, so the latest entry can be deleted without
+    downloading the whole sheet.
+
+    Args:
+        undo_depth (int): Number of appended rows remembered per spreadsheet.
+    """
+
+    def __init__(self, undo_depth=10):
+        self.undo_depth = undo_depth
+        self._last_rows = {}
+        self._undo = {}
+        self._lock = threading.Lock()
+        self.seeds = 0
+
+    def last_entry(self, spreadsheet_id, seed):
+        """
+        Returns `(last_row, expected_values, seeded)` for `spreadsheet_id`.
+        `seed()` is called for the row count when it is not tracked yet, and
+        `expected_values` is the row as appended by the app, or None if unknown.
+        """
+        with self._lock:
+            last_row = self._last_rows.get(spreadsheet_id)
+            if last_row is not None:
+                undo = self._undo.get(spreadsheet_id)
+                expected = undo[-1][1] if undo and undo[-1][0] == last_row else None
+                return last_row, expected, False
+
+        last_row = seed()
+        with self._lock:
+            self._last_rows[spreadsheet_id] = last_row
+            self._undo.pop(spreadsheet_id, None)
+            self.seeds += 1
+        return last_row, None, True
+
+    def tracked(self, spreadsheet_id):
+        """Returns `(last_row, expected_values)` if the last row is tracked, or None."""
+        with self._lock:
+            last_row = self._last_rows.get(spreadsheet_id)
+            if last_row is None:
+                return None
+            undo = self._undo.get(spreadsheet_id)
+            return last_row, undo[-1][1] if undo and undo[-1][0] == last_row else None
+
+    def record_append(self, spreadsheet_id, first_row, rows):
+        with self._lock:
+            undo = self._undo.setdefault(spreadsheet_id, deque(maxlen=self.undo_depth))
+            for offset, row in enumerate(rows):
+                undo.append((first_row + offset, [str(value) for value in row]))
+            self._last_rows[spreadsheet_id] = first_row + len(rows) - 1
+
+    def record_delete(self, spreadsheet_id):
+        with self._lock:
+            last_row = self._last_rows.get(spreadsheet_id)
+            if last_row is None:
+                return
+            undo = self._undo.get(spreadsheet_id)
+            if undo and undo[-1][0] == last_row:
+                undo.pop()
+            self._last_rows[spreadsheet_id] = last_row - 1
+
+    def reset(self, spreadsheet_id, last_row=1):
+        with self._lock:
+            self._last_rows[spreadsheet_id] = last_row
+            self._undo.pop(spreadsheet_id, None)
+
+    def invalidate(self, spreadsheet_id):
+        with self._lock:
+            self._last_rows.pop(spreadsheet_id, None)
+            self._undo.pop(spreadsheet_id, None)
@@ -0,0 +1,134 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemorySessionStore:
+    """
+    In-process session store with LRU eviction and idle expiry.
+    Only suitable when the app runs as a single process.
+
+    Args:
+        max_sessions (int): Maximum number of sessions kept.
+        idle_ttl (float): Seconds after the last update a session expires.
+    """
+
+    def __init__(self, max_sessions=10000, idle_ttl=30 * 86400):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Returns a copy of the session of `user_id`, or None if there is none."""
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            if entry is None:
+                return None
+            if time.time() - entry[1] > self.idle_ttl:
+                del self._sessions[user_id]
+                return None
+            self._sessions.move_to_end(user_id)
+            return json.loads(entry[0])
+
+    def set(self, user_id, session):
+        # 以 JSON 保存，行為與 SQLite 後端一致
+        with self._lock:
+            self._sessions[user_id] = (json.dumps(session, ensure_ascii=False), time.time())
+            self._sessions.move_to_end(user_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+class SqliteSessionStore:
+    """
+    Session store in a SQLite database, so linked sheets and input stages
+    survive a restart of the app.
+
+    It is persistent, not shared: the app must still run as a single
+    worker process (with threads) with this backend. The aggregates, row
+    tracker, write-behind buffer and per-user event ordering in app.py are
+    per process, so with several workers a command handled by one worker
+    may miss rows added through another, '刪除上一筆' may delete an older
+    row while a newer one is still pending elsewhere, and two events of the
+    same user may update the session concurrently and lose one change.
+
+    Args:
+        path (str): Path of the SQLite database file.
+        idle_ttl (float): Seconds after the last update a session expires.
+        prune_every (int): Writes between removals of expired sessions.
+    """
+
+    def __init__(self, path, idle_ttl=30 * 86400, prune_every=1000):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._writes = 0
+        connection = self._connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'user_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, user_id):
+        """Returns the session of `user_id`, or None if there is none."""
+        row = self._connection().execute(
+            'SELECT data FROM sessions WHERE user_id = ? AND updated_at > ?',
+            (user_id, time.time() - self.idle_ttl)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, user_id, session):
+        connection = self._connection()
+        connection.execute(
+            'INSERT INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at',
+            (user_id, json.dumps(session, ensure_ascii=False), time.time())
+        )
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            connection.execute('DELETE FROM sessions WHERE updated_at <= ?', (time.time() - self.idle_ttl,))
+
+    def delete(self, user_id):
+        self._connection().execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+def create_session_store(url, idle_ttl=30 * 86400, max_sessions=10000):
+    """
+    Creates a session store from a URL: 'memory' for the in-process
+    store, or 'sqlite:///path/to/sessions.db' for the persistent one.
+    Both require the app to run as a single worker process.
+    """
+    if url.startswith('sqlite:///'):
+        path = url[len('sqlite:///'):]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return SqliteSessionStore(path, idle_ttl=idle_ttl)
+    if url == 'memory':
+        return MemorySessionStore(max_sessions=max_sessions, idle_ttl=idle_ttl)
+    raise ValueError(f"不支援的 session store: {url}")
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from google.auth.exceptions import RefreshError
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+
+# 開啟工作表時 gc.open_by_key() 與 .sheet1 各會讀取一次試算表中繼資料
+CALLS_PER_OPEN = 2
+
+# 代表工作表已失效 (無權限、找不到或憑證過期) 的 HTTP 狀態碼
+INVALIDATING_STATUS = {401, 403, 404}
+
+
+def is_invalidating_error(error):
+    """Returns True if `error` means a cached worksheet handle is no longer usable."""
+    if isinstance(error, (SpreadsheetNotFound, WorksheetNotFound, PermissionError, RefreshError)):
+        return True
+    return isinstance(error, APIError) and error.code in INVALIDATING_STATUS
+
+
+class WorksheetCache:
+    """
+    Per-spreadsheet cache of `sheet1` worksheet handles with TTL and LRU
+    eviction, shared by all Sheets helpers.
+
+    Args:
+        open_worksheet (callable): Opens the first worksheet of a spreadsheet ID,
+            e.g. `lambda key: gc.open_by_key(key).sheet1`.
+        ttl (float): Seconds a cached handle stays valid.
+        max_size (int): Maximum number of cached spreadsheets.
+    """
+
+    def __init__(self, open_worksheet, ttl=300, max_size=256):
+        self.open_worksheet = open_worksheet
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.requests = 0
+        self.request_calls_saved = 0
+
+    def get(self, spreadsheet_id):
+        """Returns the first worksheet of `spreadsheet_id`, opening it on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(spreadsheet_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(spreadsheet_id)
+                self.hits += 1
+                self._local.saved = getattr(self._local, 'saved', 0) + CALLS_PER_OPEN
+                return entry[0]
+            self.misses += 1
+
+        worksheet = self.open_worksheet(spreadsheet_id)
+
+        with self._lock:
+            self._entries[spreadsheet_id] = (worksheet, time.monotonic() + self.ttl)
+            self._entries.move_to_end(spreadsheet_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return worksheet
+
+    def invalidate(self, spreadsheet_id):
+        with self._lock:
+            if self._entries.pop(spreadsheet_id, None) is not None:
+                self.invalidations += 1
+
+    @contextmanager
+    def guard(self, spreadsheet_id):
+        """Drops the cached handle if the wrapped Sheets calls hit an auth or not-found error."""
+        try:
+            yield
+        except Exception as e:
+            if is_invalidating_error(e):
+                self.invalidate(spreadsheet_id)
+            raise
+
+    @contextmanager
+    def request_scope(self):
+        """Counts the API calls saved by cache hits during one webhook request."""
+        self._local.saved = 0
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.requests += 1
+                self.request_calls_saved += self._local.saved
+            self._local.saved = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'api_calls_saved': self.hits * CALLS_PER_OPEN,
+                'api_calls_saved_per_request': self.request_calls_saved / self.requests if self.requests else 0.0,
+            }
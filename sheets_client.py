@@ -0,0 +1,254 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from gspread.exceptions import APIError
+
+# 試算表回應這些狀態碼時代表配額用盡或暫時性錯誤，可以稍後重試
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# 只讀取資料的 gspread 方法，相同的讀取可以合併成一次 API 呼叫
+READ_METHODS = {'get', 'get_all_records', 'get_all_values', 'row_values', 'col_values', 'acell', 'cell', 'batch_get'}
+
+
+def is_retryable_error(error, idempotent=True):
+    """
+    Returns True if retrying the call that raised `error` may succeed.
+
+    A 429 means the request was rejected before it ran, so it is always
+    safe to retry. Server errors are only retried for idempotent calls,
+    since a write may have been applied before the error was returned.
+    """
+    if not isinstance(error, APIError):
+        return False
+    if error.code == 429:
+        return True
+    return idempotent and error.code in RETRYABLE_STATUS
+
+
+def retry_after(error):
+    """Returns the Retry-After delay in seconds sent with `error`, or None."""
+    response = getattr(error, 'response', None)
+    value = response.headers.get('Retry-After') if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that refills `rate` tokens per second up to
+    `capacity`. Callers reserve tokens in arrival order and sleep until
+    their reservation is covered, so waiting callers are served FIFO.
+    """
+
+    def __init__(self, rate, capacity):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError(f"rate 與 capacity 必須大於 0: rate={rate}, capacity={capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Blocks until `tokens` tokens are available and returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is in
+    flight, later callers with the same key wait for and share its result
+    (or exception) instead of running it again. Shared results must not be
+    mutated by the callers.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, func):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = self._calls[key] = Future()
+                leader = True
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    def _finish(self, key):
+        # 先移除再設定結果，之後才到的呼叫會重新讀取最新資料
+        with self._lock:
+            del self._calls[key]
+
+
+class SheetsClient:
+    """
+    Central entry point for Google Sheets API calls.
+
+    Every call first takes a token from a bucket sized to the project
+    quota: after a burst of `burst` requests it refills at the remaining
+    per-minute rate, so no 60-second window exceeds `quota_per_minute` and
+    bursts are queued instead of being rejected. Calls that still fail
+    with a quota or transient error are retried with jittered exponential
+    backoff, and identical reads of a spreadsheet that are in flight at the
+    same time share one API call.
+
+    Args:
+        quota_per_minute (float): Sheets API requests allowed per minute.
+        burst (int): Requests that may be sent at once after an idle period;
+            must be at least 1 and less than `quota_per_minute`.
+        max_retries (int): Retries after the first attempt before giving up.
+        base_delay (float): Backoff ceiling in seconds for the first retry.
+        max_delay (float): Upper bound in seconds for any single backoff.
+        registry (MetricsRegistry): Receives the 'sheets.quota_wait' and
+            'sheets.backoff' histograms, if given.
+    """
+
+    def __init__(self, quota_per_minute=60, burst=10, max_retries=5, base_delay=1.0, max_delay=32.0, registry=None):
+        if burst < 1 or quota_per_minute <= burst:
+            raise ValueError(
+                f"SHEETS_QUOTA_PER_MINUTE ({quota_per_minute}) 必須大於 SHEETS_BURST ({burst})，且 SHEETS_BURST 至少為 1"
+            )
+        if max_retries < 0 or base_delay < 0 or max_delay < 0:
+            raise ValueError("max_retries、base_delay 與 max_delay 不可為負數")
+        self.limiter = TokenBucket((quota_per_minute - burst) / 60, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.registry = registry
+        self.single_flight = SingleFlight()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled = 0
+
+    def _observe(self, name, seconds):
+        if self.registry is not None:
+            self.registry.observe(name, seconds)
+
+    def backoff(self, attempt, error=None):
+        """Returns the delay before retry number `attempt` (0-based), with full jitter."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        hinted = retry_after(error) if error is not None else None
+        return max(delay, min(hinted, self.max_delay)) if hinted is not None else delay
+
+    def call(self, func, *args, tokens=1, idempotent=True, **kwargs):
+        """
+        Calls `func(*args, **kwargs)` within the quota, retrying quota and
+        transient errors.
+
+        Args:
+            func (callable): The gspread call.
+            tokens (int): Sheets API requests the call makes.
+            idempotent (bool): False for writes that must not be retried
+                after a server error.
+
+        Returns:
+            The result of `func`.
+        """
+        attempt = 0
+        while True:
+            waited = self.limiter.acquire(tokens)
+            self._observe('sheets.quota_wait', waited)
+            with self._lock:
+                self.calls += 1
+                if waited:
+                    self.throttled += 1
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e, idempotent):
+                    if is_retryable_error(e, idempotent):
+                        with self._lock:
+                            self.failures += 1
+                    raise
+                delay = self.backoff(attempt, e)
+                with self._lock:
+                    self.retries += 1
+            self._observe('sheets.backoff', delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def generation(self, spreadsheet_id):
+        with self._lock:
+            return self._generations.get(spreadsheet_id, 0)
+
+    def _bump_generation(self, spreadsheet_id):
+        with self._lock:
+            self._generations[spreadsheet_id] = self._generations.get(spreadsheet_id, 0) + 1
+
+    def read(self, spreadsheet_id, name, func, *args, **kwargs):
+        """
+        Like `call`, but shares the result with identical reads of
+        `spreadsheet_id` already in flight. Reads started before a write to
+        the same spreadsheet are never shared with reads started after it.
+        """
+        key = (spreadsheet_id, self.generation(spreadsheet_id), name, repr(args), repr(sorted(kwargs.items())))
+        return self.single_flight.do(key, lambda: self.call(func, *args, **kwargs))
+
+    def write(self, spreadsheet_id, func, *args, **kwargs):
+        """Like `call` for a non-idempotent write to `spreadsheet_id`."""
+        self._bump_generation(spreadsheet_id)
+        try:
+            return self.call(func, *args, idempotent=False, **kwargs)
+        finally:
+            self._bump_generation(spreadsheet_id)
+
+    def worksheet(self, spreadsheet_id, worksheet):
+        """Wraps a gspread worksheet so all its API calls go through this client."""
+        return SheetsProxy(self, spreadsheet_id, worksheet)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'throttled': self.throttled,
+                'retries': self.retries,
+                'failures': self.failures,
+                'coalesced': self.single_flight.coalesced,
+            }
+
+
+class SheetsProxy:
+    """Routes the method calls of a gspread worksheet through a `SheetsClient`."""
+
+    def __init__(self, client, spreadsheet_id, target):
+        self._client = client
+        self._spreadsheet_id = spreadsheet_id
+        self._target = target
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+        if name in READ_METHODS:
+            return lambda *args, **kwargs: self._client.read(self._spreadsheet_id, name, attribute, *args, **kwargs)
+        return lambda *args, **kwargs: self._client.write(self._spreadsheet_id, attribute, *args, **kwargs)
@@ -0,0 +1,34 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from fakes import FakeLineBotApi, FakeModel, FakeSheetsService, import_app
+
+
+@pytest.fixture(scope='session')
+def harness(tmp_path_factory):
+    sheets = FakeSheetsService()
+    app = import_app(
+        sheets,
+        FakeLineBotApi(),
+        str(tmp_path_factory.mktemp('journal') / 'write_behind.journal'),
+        FakeModel(),
+        # 只在測試中明確呼叫 flush 時寫入，並放寬配額限制
+        env={'WRITE_BEHIND_INTERVAL': '3600', 'SHEETS_QUOTA_PER_MINUTE': '100000', 'SHEETS_BURST': '1000'}
+    )
+    return app, sheets
+
+
+def make_entry(name, calories):
+    timestamp = (datetime.utcnow() + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S')
+    return {'timestamp': timestamp, 'category': '飲料', 'name': name, 'calories': calories}
+
+
+def sheet_names(sheets, spreadsheet_id):
+    return [row[2] for row in sheets.rows(spreadsheet_id)[1:]]
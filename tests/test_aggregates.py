@@ -0,0 +1,114 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from aggregates import AggregateStore, CalorieAggregate, TIMESTAMP_FORMAT
+
+NOW = datetime(2024, 3, 10, 12, 30, 0)
+
+
+def original_sum(records, now, days):
+    # 改為增量統計之前 sum_calories 的算法
+    return sum(
+        int(record['calories']) for record in records
+        if (now - datetime.strptime(record['timestamp'], TIMESTAMP_FORMAT)).days < days
+    )
+
+
+def original_ratios(records):
+    totals = {}
+    for record in records:
+        totals[record['category']] = totals.get(record['category'], 0) + int(record['calories'])
+    total = sum(totals.values())
+    return {category: calories / total * 100 for category, calories in totals.items()}
+
+
+def record(timestamp, category='飲料', calories=100):
+    return {'timestamp': timestamp.strftime(TIMESTAMP_FORMAT), 'category': category, 'calories': calories}
+
+
+@pytest.mark.parametrize('days', [1, 7])
+def test_boundaries_match_original_formula(days):
+    cutoff = NOW - timedelta(days=days)
+    timestamps = [
+        cutoff - timedelta(seconds=1),
+        cutoff,
+        cutoff + timedelta(seconds=1),
+        NOW.replace(hour=0, minute=0, second=0),
+        NOW,
+        NOW + timedelta(seconds=1),
+        NOW + timedelta(days=3),
+    ]
+    records = [record(timestamp, calories=2 ** index) for index, timestamp in enumerate(timestamps)]
+    aggregate = CalorieAggregate.from_records(records)
+    assert aggregate.sum_since(NOW, days) == original_sum(records, NOW, days)
+
+
+def test_random_appends_and_deletes_match_original_formula():
+    rng = random.Random(0)
+    aggregate = CalorieAggregate()
+    records = []
+    for _ in range(500):
+        if records and rng.random() < 0.3:
+            records.pop()
+            aggregate.remove_last()
+        else:
+            # 包含過去與未來的時間，以及落在整秒邊界上的資料
+            timestamp = NOW + timedelta(seconds=rng.randrange(-10 * 86400, 2 * 86400))
+            if rng.random() < 0.1:
+                timestamp = NOW - timedelta(days=rng.choice([1, 7]))
+            row = record(timestamp, rng.choice(['飲料', '主食', '點心']), rng.randrange(0, 800))
+            records.append(row)
+            aggregate.add(row['timestamp'], row['category'], row['calories'])
+
+        for days in (1, 7):
+            assert aggregate.sum_since(NOW, days) == original_sum(records, NOW, days)
+
+    if records:
+        assert aggregate.category_ratios() == pytest.approx(original_ratios(records))
+
+
+def test_remove_last_restores_empty_state():
+    aggregate = CalorieAggregate()
+    aggregate.add('2024-03-10 08:00:00', '飲料', 150)
+    aggregate.remove_last()
+    aggregate.remove_last()
+    assert aggregate.sum_since(NOW, 7) == 0
+    assert aggregate.category_ratios() == {}
+    assert aggregate.last_day is None
+
+
+def test_store_applies_updates_only_to_loaded_aggregates():
+    store = AggregateStore(max_age=600)
+    loads = []
+
+    def load_records():
+        loads.append(1)
+        return [record(NOW - timedelta(hours=1), calories=100)]
+
+    store.record_append('sheet', ['2024-03-10 11:00:00', '飲料', '可樂', 50])
+    assert store.read('sheet', load_records, lambda aggregate: aggregate.sum_since(NOW, 1)) == 100
+    store.record_append('sheet', ['2024-03-10 12:00:00', '飲料', '可樂', 50])
+    store.record_delete_last('sheet')
+    store.record_append('sheet', ['2024-03-10 12:00:00', '飲料', '可樂', 30])
+    assert store.read('sheet', load_records, lambda aggregate: aggregate.sum_since(NOW, 1)) == 130
+    assert len(loads) == 1
+
+    store.record_clear('sheet')
+    assert store.read('sheet', load_records, lambda aggregate: aggregate.sum_since(NOW, 1)) == 0
+    assert len(loads) == 1
+
+
+def test_unparsable_update_falls_back_to_reload():
+    store = AggregateStore(max_age=600)
+    loads = []
+
+    def load_records():
+        loads.append(1)
+        return []
+
+    store.read('sheet', load_records, lambda aggregate: None)
+    store.record_append('sheet', ['not a timestamp', '飲料', '可樂', 50])
+    store.read('sheet', load_records, lambda aggregate: None)
+    assert len(loads) == 2
@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from analytics import CalorieLog
+from conftest import make_entry
+
+FIRST_DAY = '2026-03-10'
+LAST_DAY = '2026-03-16'
+
+
+def day_totals(series):
+    days, totals = series
+    return {str(day): float(total) for day, total in zip(days, totals)}
+
+
+@pytest.fixture
+def boundary_log():
+    # 每個日期邊界兩側各一筆，確認 00:00:00 與 23:59:59 歸在正確的日期
+    return CalorieLog.from_entries([
+        (datetime(2026, 3, 9, 23, 59, 59), '飲料', 1),
+        (datetime(2026, 3, 10, 0, 0, 0), '飲料', 2),
+        (datetime(2026, 3, 10, 23, 59, 59), '主食', 4),
+        (datetime(2026, 3, 11, 0, 0, 0), '主食', 8),
+        (datetime(2026, 3, 16, 23, 59, 59), '點心', 16),
+        (datetime(2026, 3, 17, 0, 0, 0), '點心', 32),
+    ])
+
+
+def test_empty_log():
+    log = CalorieLog.from_entries([])
+
+    assert len(log) == 0
+    assert log.total() == 0
+    assert log.category_breakdown() == {}
+    assert day_totals(log.daily_series(FIRST_DAY, LAST_DAY)) == {
+        str(np.datetime64(FIRST_DAY) + offset): 0.0 for offset in range(7)
+    }
+    week_starts, week_totals = log.weekly_series(LAST_DAY, 4)
+    assert [str(start) for start in week_starts] == ['2026-02-17', '2026-02-24', '2026-03-03', '2026-03-10']
+    assert week_totals.tolist() == [0, 0, 0, 0]
+    days, averages = log.rolling_average(FIRST_DAY, LAST_DAY, 7)
+    assert len(days) == 7
+    assert averages.tolist() == [0] * 7
+
+
+def test_daily_series_boundaries(boundary_log):
+    assert day_totals(boundary_log.daily_series(FIRST_DAY, LAST_DAY)) == {
+        '2026-03-10': 6.0,
+        '2026-03-11': 8.0,
+        '2026-03-12': 0.0,
+        '2026-03-13': 0.0,
+        '2026-03-14': 0.0,
+        '2026-03-15': 0.0,
+        '2026-03-16': 16.0,
+    }
+
+
+def test_daily_series_single_day(boundary_log):
+    assert day_totals(boundary_log.daily_series('2026-03-09', '2026-03-09')) == {'2026-03-09': 1.0}
+    assert day_totals(boundary_log.daily_series('2026-03-12', '2026-03-12')) == {'2026-03-12': 0.0}
+
+
+def test_weekly_series_boundaries(boundary_log):
+    week_starts, week_totals = boundary_log.weekly_series(LAST_DAY, 2)
+
+    assert [str(start) for start in week_starts] == ['2026-03-03', FIRST_DAY]
+    assert week_totals.tolist() == [1, 30]
+
+
+def test_rolling_average_matches_daily_means(boundary_log):
+    days, averages = boundary_log.rolling_average('2026-03-11', LAST_DAY, 3)
+    _, totals = boundary_log.daily_series('2026-03-07', LAST_DAY)
+    expected = [totals[index - 2:index + 1].mean() for index in range(4, len(totals))]
+
+    assert [str(day) for day in days] == ['2026-03-11', '2026-03-12', '2026-03-13', '2026-03-14', '2026-03-15', '2026-03-16']
+    assert averages.tolist() == pytest.approx(expected)
+    assert averages.tolist() == pytest.approx([15 / 3, 14 / 3, 8 / 3, 0, 0, 16 / 3])
+
+
+def test_total_and_breakdown_exclude_start(boundary_log):
+    start = datetime(2026, 3, 10, 0, 0, 0)
+    end = datetime(2026, 3, 16, 23, 59, 59)
+
+    assert boundary_log.total(start, end) == 4 + 8 + 16
+    assert boundary_log.category_breakdown(start, end) == {'點心': 16.0, '主食': 12.0}
+
+
+NOW = datetime(2026, 3, 18, 12, 0, 0)
+
+
+class FixedDatetime(datetime):
+    @classmethod
+    def utcnow(cls):
+        return NOW - timedelta(hours=8)
+
+
+def add_entry(app, spreadsheet_id, timestamp, category, calories):
+    entry = make_entry('測試', str(calories))
+    entry.update(timestamp=timestamp.strftime('%Y-%m-%d %H:%M:%S'), category=category)
+    app.append_values(spreadsheet_id, entry)
+
+
+def test_report_without_entries(harness, monkeypatch):
+    app, _ = harness
+    monkeypatch.setattr(app, 'datetime', FixedDatetime)
+    app.add_headers('sheet-report-empty')
+
+    assert app.build_report('sheet-report-empty') == "\n".join([
+        "近7天每日熱量:",
+        "03-12: 0 大卡",
+        "03-13: 0 大卡",
+        "03-14: 0 大卡",
+        "03-15: 0 大卡",
+        "03-16: 0 大卡",
+        "03-17: 0 大卡",
+        "03-18: 0 大卡",
+        "7天平均: 0 大卡/天",
+        "近4週熱量:",
+        "02-19 起: 0 大卡",
+        "02-26 起: 0 大卡",
+        "03-05 起: 0 大卡",
+        "03-12 起: 0 大卡",
+        "近30天飲食比例:",
+    ])
+
+
+def test_report_boundaries(harness, monkeypatch):
+    app, _ = harness
+    monkeypatch.setattr(app, 'datetime', FixedDatetime)
+    spreadsheet_id = 'sheet-report'
+    app.add_headers(spreadsheet_id)
+    add_entry(app, spreadsheet_id, datetime(2026, 2, 16, 12, 0, 0), '甜點', 6400)
+    add_entry(app, spreadsheet_id, datetime(2026, 2, 18, 23, 59, 59), '點心', 3200)
+    add_entry(app, spreadsheet_id, datetime(2026, 2, 19, 0, 0, 0), '點心', 1600)
+    add_entry(app, spreadsheet_id, datetime(2026, 3, 11, 23, 59, 59), '飲料', 400)
+    add_entry(app, spreadsheet_id, datetime(2026, 3, 12, 0, 0, 0), '主食', 800)
+    add_entry(app, spreadsheet_id, datetime(2026, 3, 17, 23, 59, 59), '主食', 200)
+    add_entry(app, spreadsheet_id, datetime(2026, 3, 18, 0, 0, 0), '飲料', 100)
+    assert app.write_buffer.flush(spreadsheet_id)
+
+    expected = "\n".join([
+        "近7天每日熱量:",
+        "03-12: 800 大卡",
+        "03-13: 0 大卡",
+        "03-14: 0 大卡",
+        "03-15: 0 大卡",
+        "03-16: 0 大卡",
+        "03-17: 200 大卡",
+        "03-18: 100 大卡",
+        "7天平均: 157 大卡/天",
+        "近4週熱量:",
+        "02-19 起: 1600 大卡",
+        "02-26 起: 0 大卡",
+        "03-05 起: 400 大卡",
+        "03-12 起: 1100 大卡",
+        # 剛好 30 天前的資料不列入比例
+        "近30天飲食比例:",
+        "點心: 76.19%",
+        "主食: 15.87%",
+        "飲料: 7.94%",
+    ])
+    assert app.build_report(spreadsheet_id) == expected
+
+    # 從試算表重新讀取的結果應與累計結果相同
+    app.aggregate_store.invalidate(spreadsheet_id)
+    assert app.build_report(spreadsheet_id) == expected
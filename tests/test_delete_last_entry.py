@@ -0,0 +1,114 @@
+from conftest import make_entry, sheet_names
+from fakes import server_error
+
+
+def test_deletes_pending_row_whose_write_failed(harness):
+    app, sheets = harness
+    spreadsheet_id = 'sheet-failed-write'
+    app.add_headers(spreadsheet_id)
+    app.append_values(spreadsheet_id, make_entry('A', '100'))
+    assert app.write_buffer.flush(spreadsheet_id)
+    assert app.sum_calories(spreadsheet_id, 1) == 100
+
+    # B 的 append_rows 回傳 503 且沒有寫入，B 仍在暫存中
+    sheets.fail_next('append_rows', server_error(503))
+    app.append_values(spreadsheet_id, make_entry('B', '200'))
+    assert not app.write_buffer.flush(spreadsheet_id)
+
+    app.delete_last_entry(spreadsheet_id)
+
+    assert app.write_buffer.flush(spreadsheet_id)
+    assert sheet_names(sheets, spreadsheet_id) == ['A']
+    assert app.sum_calories(spreadsheet_id, 1) == 100
+    app.aggregate_store.invalidate(spreadsheet_id)
+    assert app.sum_calories(spreadsheet_id, 1) == 100
+
+
+def test_deletes_sheet_row_when_nothing_is_pending(harness):
+    app, sheets = harness
+    spreadsheet_id = 'sheet-written'
+    app.add_headers(spreadsheet_id)
+    app.append_values(spreadsheet_id, make_entry('A', '100'))
+    app.append_values(spreadsheet_id, make_entry('B', '200'))
+    assert app.write_buffer.flush(spreadsheet_id)
+
+    app.delete_last_entry(spreadsheet_id)
+
+    assert sheet_names(sheets, spreadsheet_id) == ['A']
+    assert app.sum_calories(spreadsheet_id, 1) == 100
+
+
+def forget_rows(app, spreadsheet_id):
+    # 模擬重新啟動後還沒有追蹤最後一列的狀態
+    app.row_tracker.invalidate(spreadsheet_id)
+    app.aggregate_store.invalidate(spreadsheet_id)
+
+
+def test_deletes_last_row_with_blank_first_column(harness):
+    app, sheets = harness
+    spreadsheet_id = 'sheet-blank-timestamp'
+    app.add_headers(spreadsheet_id)
+    app.append_values(spreadsheet_id, make_entry('A', '100'))
+    assert app.write_buffer.flush(spreadsheet_id)
+    # 使用者手動新增一列但沒有填時間
+    sheets.rows(spreadsheet_id).append(['', '飲料', 'B', '200'])
+    forget_rows(app, spreadsheet_id)
+
+    app.delete_last_entry(spreadsheet_id)
+
+    assert sheet_names(sheets, spreadsheet_id) == ['A']
+
+
+def test_finds_last_row_with_bounded_reads(harness, monkeypatch):
+    app, sheets = harness
+    monkeypatch.setattr(app, 'ROW_SCAN_WINDOW', 4)
+    spreadsheet_id = 'sheet-long'
+    app.add_headers(spreadsheet_id)
+    for index in range(30):
+        app.append_values(spreadsheet_id, make_entry(f'N{index}', '10'))
+    assert app.write_buffer.flush(spreadsheet_id)
+    forget_rows(app, spreadsheet_id)
+
+    before = sheets.calls.snapshot()
+    app.delete_last_entry(spreadsheet_id)
+    calls = sheets.calls.snapshot() - before
+
+    assert sheet_names(sheets, spreadsheet_id)[-1] == 'N28'
+    # 依序讀取 4、8、16、32 列，在最後一段找到第 31 列，不下載整欄
+    assert calls == {'get': 4, 'delete_rows': 1}
+
+
+def test_seeds_from_loaded_aggregate(harness):
+    app, sheets = harness
+    spreadsheet_id = 'sheet-aggregate-hint'
+    app.add_headers(spreadsheet_id)
+    for index in range(5):
+        app.append_values(spreadsheet_id, make_entry(f'N{index}', '10'))
+    assert app.write_buffer.flush(spreadsheet_id)
+    app.row_tracker.invalidate(spreadsheet_id)
+    assert app.sum_calories(spreadsheet_id, 1) == 50
+
+    before = sheets.calls.snapshot()
+    app.delete_last_entry(spreadsheet_id)
+    calls = sheets.calls.snapshot() - before
+
+    assert sheet_names(sheets, spreadsheet_id) == ['N0', 'N1', 'N2', 'N3']
+    assert calls == {'get': 1, 'delete_rows': 1}
+    assert app.sum_calories(spreadsheet_id, 1) == 40
+
+
+def test_rescans_when_rows_were_removed_by_hand(harness):
+    app, sheets = harness
+    spreadsheet_id = 'sheet-shrunk'
+    app.add_headers(spreadsheet_id)
+    for index in range(5):
+        app.append_values(spreadsheet_id, make_entry(f'N{index}', '10'))
+    assert app.write_buffer.flush(spreadsheet_id)
+    app.row_tracker.invalidate(spreadsheet_id)
+    assert app.sum_calories(spreadsheet_id, 1) == 50
+    # 統計仍記得 5 筆，但使用者已刪除最後三列
+    del sheets.rows(spreadsheet_id)[3:]
+
+    app.delete_last_entry(spreadsheet_id)
+
+    assert sheet_names(sheets, spreadsheet_id) == ['N0']
@@ -0,0 +1,60 @@
+import pytest
+
+from food_search import FoodIndex, split_aliases
+from food_table import load_table
+
+NAMES = [
+    '紅茶(大麥)',
+    '大麥仁',
+    '大麥片',
+    '紅茶(蘋果)',
+    '蘋果汁',
+    '蘋果',
+    '可口可樂(Coca-cola)',
+    '可樂(Coca-cola)',
+    '可樂(低熱量)',
+    '可樂',
+    '牛肉麵(Beef Soup Noodles)',
+]
+
+
+@pytest.fixture(scope='module')
+def index():
+    return FoodIndex(NAMES)
+
+
+def test_only_latin_brackets_are_aliases():
+    assert split_aliases('可樂(coca-cola)') == {'可樂', 'coca-cola'}
+    assert split_aliases('紅茶(大麥)') == {'紅茶'}
+    assert split_aliases('鈣&維生素c,e強化') == set()
+    assert split_aliases('牛奶(高維生素e)') == {'牛奶'}
+
+
+def test_chinese_qualifier_does_not_outrank_prefix(index):
+    assert index.search('大麥', 3) == ['大麥仁', '大麥片', '紅茶(大麥)']
+    assert index.search('蘋果', 3) == ['蘋果', '蘋果汁', '紅茶(蘋果)']
+
+
+def test_exact_then_alias_then_prefix_then_substring(index):
+    assert index.search('可樂', 4) == ['可樂', '可樂(低熱量)', '可樂(Coca-cola)', '可口可樂(Coca-cola)']
+
+
+def test_english_alias_matches_case_insensitively(index):
+    assert index.search('COCA-COLA', 2) == ['可樂(Coca-cola)', '可口可樂(Coca-cola)']
+    assert index.lookup('beef soup noodles') == '牛肉麵(Beef Soup Noodles)'
+
+
+def test_base_name_matches_as_alias(index):
+    assert index.search('紅茶', 2) == ['紅茶(大麥)', '紅茶(蘋果)']
+
+
+def test_empty_and_unknown_queries(index):
+    assert index.search('   ') == []
+    assert index.search('不存在的食物') == []
+
+
+def test_real_table_ranking():
+    index = FoodIndex.from_table(load_table())
+    assert index.search('大麥', 2) == ['大麥仁', '大麥片']
+    assert index.search('蘋果', 2) == ['蘋果', '蘋果汁']
+    assert index.lookup('可樂') == '可樂'
@@ -0,0 +1,52 @@
+from food_search import FoodIndex
+from food_table import FoodTable, build, load_table, source_digest
+
+
+def test_committed_table_matches_food_py():
+    # food.py 修改後請執行 python food_table.py 重新產生 food.bin
+    assert load_table().source_digest == source_digest()
+
+
+def test_build_round_trip(tmp_path):
+    path = str(tmp_path / 'food.bin')
+    source = {
+        '可樂': ['150', '1 罐'],
+        '柳橙  汁': [120, '1 杯'],
+        '可樂(Coca-cola)': ['140', '1 罐'],
+        '沒有熱量': ['', '1 份'],
+        ' 可樂 ': ['999', '1 罐'],
+    }
+
+    assert build(source, path) == 3
+    table = FoodTable(path)
+
+    assert len(table) == 3
+    assert list(table.names) == ['可樂', '柳橙 汁', '可樂(Coca-cola)']
+    assert table.get('柳橙 汁') == (120.0, '1 杯')
+    assert table.get('可樂') == (150.0, '1 罐')
+    assert table.get('沒有熱量') is None
+    assert '可樂(Coca-cola)' in table
+    assert '雪碧' not in table
+
+
+def test_empty_table(tmp_path):
+    path = str(tmp_path / 'food.bin')
+    assert build({}, path) == 0
+    table = FoodTable(path)
+
+    assert len(table) == 0
+    assert table.get('可樂') is None
+    assert FoodIndex.from_table(table).search('可樂') == []
+
+
+def test_stored_index_matches_built_index():
+    table = load_table()
+    names = list(table.names)
+    stored = FoodIndex.from_table(table)
+    built = FoodIndex(names)
+
+    queries = {'可樂', 'coca-cola', 'COCA-COLA', '麵', '茶', '不存在的食物'}
+    for name in names[::5]:
+        queries.update((name, name[:1], name[:2], name[1:3], name.split('(')[0]))
+    for query in queries:
+        assert stored.search(query, 5) == built.search(query, 5), query
@@ -0,0 +1,32 @@
+import pytest
+
+
+@pytest.fixture
+def client(harness, monkeypatch):
+    app, _ = harness
+    monkeypatch.setattr(app, 'METRICS_TOKEN', 'secret-token')
+    return app.app.test_client()
+
+
+def test_rejects_requests_without_token_even_from_loopback(client):
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 403
+    assert client.post('/debug/profile?action=start').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+
+
+def test_accepts_valid_token(client):
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret-token'})
+    assert response.status_code == 200
+    assert 'latency' in response.get_json()
+
+
+def test_disabled_without_configured_token(harness, monkeypatch):
+    app, _ = harness
+    monkeypatch.setattr(app, 'METRICS_TOKEN', None)
+    assert app.app.test_client().get('/metrics').status_code == 404
+
+
+def test_invalid_top_is_a_bad_request(client):
+    headers = {'Authorization': 'Bearer secret-token'}
+    assert client.get('/debug/profile?top=abc', headers=headers).status_code == 400
+    assert client.get('/debug/profile?top=5', headers=headers).status_code == 200
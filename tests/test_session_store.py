@@ -0,0 +1,49 @@
+import pytest
+
+from session_store import MemorySessionStore, SqliteSessionStore, create_session_store
+
+
+def test_sqlite_sessions_survive_restart(tmp_path):
+    url = f"sqlite:///{tmp_path / 'data' / 'sessions.db'}"
+    store = create_session_store(url)
+    store.set('U1', {'sheet': 'sheet-1', 'stage': 'name', 'data': {'category': '飲料'}})
+
+    # 模擬重新啟動
+    restarted = create_session_store(url)
+    assert restarted.get('U1') == {'sheet': 'sheet-1', 'stage': 'name', 'data': {'category': '飲料'}}
+    restarted.delete('U1')
+    assert restarted.get('U1') is None
+
+
+@pytest.mark.parametrize('make_store', [
+    lambda tmp_path: MemorySessionStore(idle_ttl=-1),
+    lambda tmp_path: SqliteSessionStore(str(tmp_path / 'sessions.db'), idle_ttl=-1),
+])
+def test_idle_sessions_expire(tmp_path, make_store):
+    store = make_store(tmp_path)
+    store.set('U1', {'sheet': 'sheet-1', 'stage': None, 'data': {}})
+    assert store.get('U1') is None
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemorySessionStore(max_sessions=2)
+    store.set('U1', {'stage': None})
+    store.set('U2', {'stage': None})
+    store.get('U1')
+    store.set('U3', {'stage': None})
+
+    assert store.get('U2') is None
+    assert store.get('U1') == {'stage': None}
+    assert len(store) == 2
+
+
+def test_returned_sessions_are_copies():
+    store = MemorySessionStore()
+    store.set('U1', {'data': {}})
+    store.get('U1')['data']['name'] = '可樂'
+    assert store.get('U1') == {'data': {}}
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_session_store('redis://localhost')
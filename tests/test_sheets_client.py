@@ -0,0 +1,19 @@
+import pytest
+
+from sheets_client import SheetsClient, TokenBucket
+
+
+@pytest.mark.parametrize('quota_per_minute, burst', [(1, 1), (0.5, 1), (10, 10), (10, 0)])
+def test_rejects_quota_not_above_burst(quota_per_minute, burst):
+    with pytest.raises(ValueError):
+        SheetsClient(quota_per_minute=quota_per_minute, burst=burst)
+
+
+def test_token_bucket_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(0, 1)
+
+
+def test_accepts_small_quota():
+    client = SheetsClient(quota_per_minute=2, burst=1)
+    assert client.call(lambda: 'ok') == 'ok'
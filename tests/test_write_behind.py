@@ -0,0 +1,52 @@
+import threading
+import time
+
+from write_behind import WriteBehindBuffer
+
+
+def test_slow_write_does_not_block_other_spreadsheets(tmp_path):
+    started = threading.Event()
+
+    def write_rows(spreadsheet_id, rows):
+        if spreadsheet_id == 'slow':
+            started.set()
+            time.sleep(1)
+
+    buffer = WriteBehindBuffer(write_rows, str(tmp_path / 'journal'), flush_interval=3600)
+    buffer.append('slow', ['A'])
+    buffer.append('other', ['B'])
+    flushing = threading.Thread(target=buffer.flush, args=('slow',))
+    flushing.start()
+    assert started.wait(1)
+
+    start = time.perf_counter()
+    assert buffer.discard_last('other') == ['B']
+    assert buffer.flush('other')
+    assert time.perf_counter() - start < 0.5
+
+    flushing.join()
+    buffer.stop()
+
+
+def test_journal_is_kept_while_another_spreadsheet_is_writing(tmp_path):
+    release = threading.Event()
+
+    def write_rows(spreadsheet_id, rows):
+        if spreadsheet_id == 'slow':
+            release.wait(5)
+
+    buffer = WriteBehindBuffer(write_rows, str(tmp_path / 'journal'), flush_interval=3600)
+    buffer.append('slow', ['A'])
+    buffer.append('fast', ['B'])
+    flushing = threading.Thread(target=buffer.flush, args=('slow',))
+    flushing.start()
+    time.sleep(0.1)
+    assert buffer.flush('fast')
+
+    # slow 的資料仍在寫入中，日誌不可清空
+    with open(buffer.journal_path, encoding='utf-8') as journal:
+        assert '"A"' in journal.read()
+
+    release.set()
+    flushing.join()
+    buffer.stop()
@@ -0,0 +1,70 @@
+import pytest
+
+from conftest import make_entry, sheet_names
+from fakes import api_error, server_error
+
+
+def test_retries_server_error_when_rows_were_not_written(harness):
+    app, sheets = harness
+    spreadsheet_id = 'sheet-not-written'
+    app.add_headers(spreadsheet_id)
+    app.append_values(spreadsheet_id, make_entry('A', '100'))
+    assert app.write_buffer.flush(spreadsheet_id)
+
+    sheets.fail_next('append_rows', server_error(503))
+    saved = app.append_values(spreadsheet_id, make_entry('B', '200'))
+    assert not app.write_buffer.flush(spreadsheet_id)
+    assert app.write_buffer.flush(spreadsheet_id)
+
+    assert saved.result(timeout=1) is True
+    assert sheet_names(sheets, spreadsheet_id) == ['A', 'B']
+
+
+def test_does_not_duplicate_rows_written_before_server_error(harness):
+    app, sheets = harness
+    spreadsheet_id = 'sheet-written-then-failed'
+    app.add_headers(spreadsheet_id)
+    app.append_values(spreadsheet_id, make_entry('A', '100'))
+    assert app.write_buffer.flush(spreadsheet_id)
+
+    sheets.fail_next('append_rows', server_error(503), apply=True)
+    saved = app.append_values(spreadsheet_id, make_entry('B', '200'))
+    assert app.write_buffer.flush(spreadsheet_id)
+
+    assert saved.result(timeout=1) is True
+    assert sheet_names(sheets, spreadsheet_id) == ['A', 'B']
+    app.delete_last_entry(spreadsheet_id)
+    assert sheet_names(sheets, spreadsheet_id) == ['A']
+
+
+def test_fails_rows_when_outcome_is_unknown(harness):
+    app, sheets = harness
+    spreadsheet_id = 'sheet-unknown-outcome'
+    app.add_headers(spreadsheet_id)
+    app.row_tracker.invalidate(spreadsheet_id)
+
+    sheets.fail_next('append_rows', server_error(500), apply=True)
+    saved = app.append_values(spreadsheet_id, make_entry('A', '100'))
+    assert app.write_buffer.flush(spreadsheet_id)
+
+    with pytest.raises(Exception):
+        saved.result(timeout=1)
+    assert sheet_names(sheets, spreadsheet_id) == ['A']
+
+
+def test_client_error_does_not_block_later_rows(harness):
+    app, sheets = harness
+    spreadsheet_id = 'sheet-bad-request'
+    app.add_headers(spreadsheet_id)
+
+    sheets.fail_next('append_rows', api_error(400, 'Invalid value (fake)', 'INVALID_ARGUMENT'))
+    rejected = app.append_values(spreadsheet_id, make_entry('A', '100'))
+    assert app.write_buffer.flush(spreadsheet_id)
+    saved = app.append_values(spreadsheet_id, make_entry('B', '200'))
+    assert app.write_buffer.flush(spreadsheet_id)
+
+    with pytest.raises(Exception):
+        rejected.result(timeout=1)
+    assert saved.result(timeout=1) is True
+    assert sheet_names(sheets, spreadsheet_id) == ['B']
+    assert app.sum_calories(spreadsheet_id, 1) == 200
@@ -0,0 +1,286 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class WriteNotApplied(Exception):
+    """
+    Raised by `write_rows` when a write failed and is known not to have
+    reached the sheet, so it can be retried without duplicating rows.
+    """
+
+
+class WriteBehindBuffer:
+    """
+    Per-spreadsheet write-behind buffer for appended rows.
+
+    Rows are first written to a local journal, then coalesced into one
+    `write_rows(spreadsheet_id, rows)` call per spreadsheet every
+    `flush_interval` seconds, or as soon as `max_rows` rows are pending.
+    Each process journals to its own `<journal_path>.<pid>` file and holds
+    an exclusive lock on it while running. At startup, journals whose lock
+    is free (their process has exited) are adopted: their unwritten rows
+    are queued again and the orphaned files are removed. Journals of live
+    processes are never read or truncated. Failed writes are retried on the
+    next flush if they raised `WriteNotApplied`, or if
+    `is_permanent(error)` is False; otherwise their rows are failed.
+
+    Args:
+        write_rows (callable): Writes a list of rows to a spreadsheet.
+        journal_path (str): Path prefix of the per-process durable journals.
+        flush_interval (float): Seconds between background flushes.
+        max_rows (int): Pending rows that trigger an immediate flush.
+        is_permanent (callable): Returns True for errors that must not be
+            retried, e.g. because the rows may already have been written.
+    """
+
+    def __init__(self, write_rows, journal_path, flush_interval=0.5, max_rows=50, is_permanent=None):
+        self.write_rows = write_rows
+        self.journal_prefix = journal_path
+        self.journal_path = f'{journal_path}.{os.getpid()}'
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.is_permanent = is_permanent or (lambda error: False)
+        self._pending = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # 每個試算表各自的寫入鎖，寫入較慢的試算表不會擋住其他使用者
+        self._sheet_locks = {}
+        self._writing = 0
+        self._stopped = False
+        self._thread = None
+        self.flushes = 0
+        self.rows_written = 0
+        self._journal = self._replay()
+
+    @staticmethod
+    def _read_journal(journal):
+        """Returns the `(spreadsheet_id, row)` pairs of a journal not yet written, in order."""
+        entries = {}
+        journal.seek(0)
+        for line in journal:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 寫到一半的最後一行
+                continue
+            if record['op'] == 'append':
+                entries[record['id']] = (record['sheet'], record['row'])
+            else:
+                for row_id in record['ids']:
+                    entries.pop(row_id, None)
+        return [entry for _, entry in sorted(entries.items())]
+
+    @staticmethod
+    def _claim(path):
+        """Locks the journal at `path` if its process has exited, or returns None."""
+        try:
+            journal = open(path, 'r+', encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # 另一個行程可能已經接手並刪除這個檔案
+            if os.stat(path).st_ino == os.fstat(journal.fileno()).st_ino:
+                return journal
+        except (BlockingIOError, FileNotFoundError):
+            pass
+        journal.close()
+        return None
+
+    def _orphaned_journals(self):
+        # 各行程的日誌，以及舊版不分行程的日誌
+        pattern = re.compile(re.escape(os.path.basename(self.journal_prefix)) + r'(\.\d+)?$')
+        for path in sorted(glob.glob(glob.escape(self.journal_prefix) + '*')):
+            if path != self.journal_path and pattern.match(os.path.basename(path)):
+                yield path
+
+    def _replay(self):
+        # 鎖定自己的日誌，接手已結束行程留下的未寫入資料，並以仍待寫入的資料重寫日誌
+        journal = open(self.journal_path, 'a+', encoding='utf-8')
+        fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        entries = self._read_journal(journal)
+        adopted = []
+        for path in self._orphaned_journals():
+            orphan = self._claim(path)
+            if orphan is not None:
+                entries.extend(self._read_journal(orphan))
+                adopted.append(orphan)
+
+        journal.seek(0)
+        journal.truncate()
+        for spreadsheet_id, row in entries:
+            self._pending.setdefault(spreadsheet_id, deque()).append((self._next_id, row, Future()))
+            journal.write(json.dumps({'op': 'append', 'id': self._next_id, 'sheet': spreadsheet_id, 'row': row}, ensure_ascii=False) + '\n')
+            self._next_id += 1
+        journal.flush()
+        os.fsync(journal.fileno())
+
+        # 資料已寫入自己的日誌後才刪除接手的檔案
+        for orphan in adopted:
+            os.unlink(orphan.name)
+            orphan.close()
+        if entries:
+            logger.info("Replayed %d unwritten rows into %s", len(entries), self.journal_path)
+        return journal
+
+    @staticmethod
+    def _write_journal(journal, record):
+        journal.write(json.dumps(record, ensure_ascii=False) + '\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+
+    def append(self, spreadsheet_id, row):
+        """
+        Journals `row` and queues it for `spreadsheet_id`.
+
+        Returns:
+            Future: Resolves to True once the row is written to the sheet,
+            or to False if it was discarded before being written.
+        """
+        future = Future()
+        with self._lock:
+            row_id = self._next_id
+            self._next_id += 1
+            self._write_journal(self._journal, {'op': 'append', 'id': row_id, 'sheet': spreadsheet_id, 'row': row})
+            queue = self._pending.setdefault(spreadsheet_id, deque())
+            queue.append((row_id, row, future))
+            if len(queue) >= self.max_rows:
+                self._wakeup.notify()
+        return future
+
+    def _sheet_lock(self, spreadsheet_id):
+        with self._lock:
+            lock = self._sheet_locks.get(spreadsheet_id)
+            if lock is None:
+                lock = self._sheet_locks[spreadsheet_id] = threading.Lock()
+            return lock
+
+    def _discard(self, entries):
+        self._write_journal(self._journal, {'op': 'discard', 'ids': [row_id for row_id, _, _ in entries]})
+        for _, _, future in entries:
+            future.set_result(False)
+
+    def discard_last(self, spreadsheet_id):
+        """
+        Drops the newest row not yet written to `spreadsheet_id` and returns
+        it, or None. Waits for any write in progress, so rows of a failed
+        write are seen again instead of being skipped while in flight.
+        """
+        with self._sheet_lock(spreadsheet_id), self._lock:
+            queue = self._pending.get(spreadsheet_id)
+            if not queue:
+                return None
+            entry = queue.pop()
+            self._discard([entry])
+            return entry[1]
+
+    def discard_all(self, spreadsheet_id):
+        """Drops every pending row of `spreadsheet_id`, waiting for any write in progress."""
+        with self._sheet_lock(spreadsheet_id), self._lock:
+            queue = self._pending.pop(spreadsheet_id, None)
+            if queue:
+                self._discard(list(queue))
+
+    def flush(self, spreadsheet_id=None):
+        """
+        Writes the pending rows of `spreadsheet_id` (or of every spreadsheet) now.
+        Each spreadsheet is locked only while its own rows are written.
+
+        Returns:
+            bool: True if no rows are left pending, False if a write failed
+            and its rows are queued for a retry.
+        """
+        with self._lock:
+            spreadsheet_ids = [spreadsheet_id] if spreadsheet_id is not None else list(self._pending)
+        drained = True
+        for sheet_id in spreadsheet_ids:
+            with self._sheet_lock(sheet_id):
+                self._flush_sheet(sheet_id)
+                with self._lock:
+                    drained = drained and not self._pending.get(sheet_id)
+        return drained
+
+    def _flush_sheet(self, spreadsheet_id):
+        with self._lock:
+            queue = self._pending.pop(spreadsheet_id, None)
+            if not queue:
+                return
+            entries = list(queue)
+            self._writing += len(entries)
+
+        try:
+            self.write_rows(spreadsheet_id, [row for _, row, _ in entries])
+        except Exception as e:
+            with self._lock:
+                self._writing -= len(entries)
+                if not isinstance(e, WriteNotApplied) and self.is_permanent(e):
+                    self._write_journal(self._journal, {'op': 'discard', 'ids': [row_id for row_id, _, _ in entries]})
+                    for _, _, future in entries:
+                        future.set_exception(e)
+                else:
+                    # 保留順序，等待下次再寫入
+                    queue = self._pending.setdefault(spreadsheet_id, deque())
+                    queue.extendleft(reversed(entries))
+            logger.warning("Failed to write %d rows to %s: %s", len(entries), spreadsheet_id, e)
+            return
+
+        with self._lock:
+            self._write_journal(self._journal, {'op': 'done', 'ids': [row_id for row_id, _, _ in entries]})
+            self.flushes += 1
+            self.rows_written += len(entries)
+            self._writing -= len(entries)
+            if not self._writing and not any(self._pending.values()):
+                # 所有資料都已寫入，其他試算表也沒有寫入中的資料，日誌可以清空
+                self._journal.seek(0)
+                self._journal.truncate()
+        for _, _, future in entries:
+            future.set_result(True)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._wakeup.wait_for(
+                    lambda: self._stopped or any(len(queue) >= self.max_rows for queue in self._pending.values()),
+                    self.flush_interval
+                )
+                if self._stopped:
+                    return
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return sum(len(queue) for queue in self._pending.values())
+
+    def stop(self):
+        """Stops the background thread and writes everything still pending."""
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.flush()
+        with self._lock:
+            if not any(self._pending.values()):
+                # 沒有未寫入的資料，不必留下日誌給下一個行程
+                try:
+                    os.unlink(self.journal_path)
+                except FileNotFoundError:
+                    pass
+            self._journal.close()